@@ -0,0 +1,383 @@
+# api_server.py
+"""Headless HTTP API over database.py, auth.py and sentiment.py.
+
+Runs on aiohttp. Blocking SQLite and bcrypt calls go through
+async_database.py's DB thread pool, with its concurrency limit and query
+timeouts (a timed-out request gets 504). Sentiment requests go through the micro-batching queue in
+inference_queue.py, so concurrent requests share forward passes and slow
+inference cannot starve database requests. Write endpoints take a session
+token from /api/login (Authorization: Bearer <token>), checked with an HMAC
+instead of bcrypt, or HTTP Basic credentials. With MTIP_WRITE_BEHIND=1, ratings and reviews are committed in
+grouped transactions by write_queue.py.
+
+Endpoints:
+    GET  /api/movies?q=&limit=&offset=     list / search movies
+    GET  /api/movies/{movie_id}            movie details, user rating, sentiment summary
+    GET  /api/movies/{movie_id}/reviews    reviews with persisted sentiment
+    GET  /api/movies/{movie_id}/rating-trend?weeks=
+                                           weekly rating counts and averages (at most 520 weeks)
+    POST /api/movies/{movie_id}/rating     {"score": 1-10}            (Bearer or Basic auth)
+    POST /api/movies/{movie_id}/reviews    {"text": "..."}           (Bearer or Basic auth)
+    POST /api/register                     {"username", "password"}
+    POST /api/login                        {"username", "password"} -> session token
+    POST /api/logout                       ends the session of the Bearer token
+    POST /api/sentiment                    {"text": "..."} or {"texts": [...]}
+    GET  /api/stats?genre=                 counts and rating distributions, served from memory
+    GET  /api/metrics                      latency metrics (MTIP_METRICS=1), queue and cache stats
+
+Usage:
+    python api_server.py [--host 127.0.0.1] [--port 8080] [--workers N]
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+
+from aiohttp import web
+
+import async_database
+import auth
+import database
+import inference_queue
+import metrics
+import sentiment
+import stats
+import write_queue
+
+MAX_PAGE_SIZE = 500
+MAX_SENTIMENT_BATCH = 256
+MAX_TREND_WEEKS = 520
+
+MOVIE_COLUMNS = (
+    'movie_id', 'series_title', 'released_year', 'certificate', 'runtime', 'genre',
+    'imdb_rating', 'overview', 'director', 'stars', 'no_of_votes', 'gross',
+)
+
+async def run_db(func, *args):
+    """Run a blocking database or auth call in the DB pool"""
+    return await async_database.run(func, *args)
+
+
+async def write(kind, *args):
+    """Add a rating or review, through the group-commit queue when MTIP_WRITE_BEHIND is set"""
+    if write_queue.ENABLED:
+        return await asyncio.wrap_future(write_queue.submit(kind, *args))
+    return await run_db(database.add_rating if kind == 'rating' else database.add_review, *args)
+
+
+async def score_sentiments(texts):
+    """Score texts through the shared micro-batcher; raises QueueFullError under overload"""
+    futures = inference_queue.get_batcher().submit_many(texts)
+    return await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+
+
+def error(status, message):
+    """JSON error response"""
+    return web.json_response({'error': message}, status=status)
+
+
+async def read_json(request):
+    """Parse a JSON object body, or raise 400"""
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text='{"error": "Invalid JSON body"}', content_type='application/json')
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text='{"error": "Expected a JSON object"}', content_type='application/json')
+    return body
+
+
+def movie_id_param(request):
+    """movie_id path parameter as int, or raise 404"""
+    try:
+        return int(request.match_info['movie_id'])
+    except ValueError:
+        raise web.HTTPNotFound(text='{"error": "Movie not found"}', content_type='application/json')
+
+
+def basic_credentials(request):
+    """(username, password) from an HTTP Basic Authorization header, or None"""
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Basic '):
+        return None
+    try:
+        username, _, password = base64.b64decode(header[6:]).decode('utf-8').partition(':')
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    return username, password
+
+
+def bearer_token(request):
+    """Session token from an Authorization: Bearer header, or None"""
+    header = request.headers.get('Authorization', '')
+    return header[7:].strip() if header.startswith('Bearer ') else None
+
+
+async def authenticate(request):
+    """Return the user_id for the request's session token or credentials, or raise 401"""
+    token = bearer_token(request)
+    credentials = basic_credentials(request)
+    if token is not None:
+        success, result = await run_db(auth.verify_session, token)
+        if success:
+            return result
+    elif credentials is not None:
+        success, result = await run_db(auth.verify_login, *credentials)
+        if success:
+            return result
+    raise web.HTTPUnauthorized(
+        text='{"error": "Invalid username or password"}',
+        content_type='application/json',
+        headers={'WWW-Authenticate': 'Basic realm="MTIP"'},
+    )
+
+
+def movie_row(row):
+    """List row tuple as a dict"""
+    movie_id, title, year, rating = row
+    return {'movie_id': movie_id, 'series_title': title, 'released_year': year, 'imdb_rating': rating}
+
+
+async def list_movies(request):
+    query = request.query.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.query.get('limit', 50)), MAX_PAGE_SIZE))
+        offset = max(int(request.query.get('offset', 0)), 0)
+    except ValueError:
+        return error(400, "limit and offset must be integers")
+    movies = await run_db(database.search_movies, query, limit, offset)
+    return web.json_response({'movies': [movie_row(m) for m in movies], 'limit': limit, 'offset': offset})
+
+
+async def movie_details(request):
+    movie_id = movie_id_param(request)
+    movie, ratings, summary = await asyncio.gather(
+        run_db(database.get_movie_details, movie_id),
+        run_db(database.get_movie_ratings, movie_id),
+        run_db(database.get_movie_sentiment_summary, movie_id),
+    )
+    if movie is None:
+        return error(404, "Movie not found")
+
+    details = dict(zip(MOVIE_COLUMNS, movie))
+    avg_rating, num_ratings = ratings
+    details['user_rating'] = {'average': avg_rating, 'count': num_ratings}
+    if summary:
+        positive, neutral, negative, mean_score = summary
+        details['sentiment'] = {'positive': positive, 'neutral': neutral,
+                                'negative': negative, 'mean_score': mean_score}
+    return web.json_response(details)
+
+
+async def movie_reviews(request):
+    movie_id = movie_id_param(request)
+    reviews = await run_db(database.get_movie_reviews, movie_id)
+    return web.json_response({'reviews': [
+        {'review_id': r[0], 'user_id': r[1], 'username': r[2], 'review_text': r[3],
+         'timestamp': r[4], 'sentiment': r[5]}
+        for r in reviews
+    ]})
+
+
+async def movie_rating_trend(request):
+    movie_id = movie_id_param(request)
+    try:
+        weeks = min(int(request.query.get('weeks', MAX_TREND_WEEKS)), MAX_TREND_WEEKS)
+    except ValueError:
+        return error(400, "weeks must be an integer")
+    if weeks < 1:
+        return error(400, "weeks must be at least 1")
+    trend = await run_db(database.get_movie_rating_trend, movie_id, weeks)
+    return web.json_response({'weeks': [
+        {'week': w[0], 'given_count': w[1], 'given_average': w[2], 'count': w[3], 'average': w[4]}
+        for w in trend
+    ]})
+
+
+async def submit_rating(request):
+    user_id = await authenticate(request)
+    movie_id = movie_id_param(request)
+    body = await read_json(request)
+    score = body.get('score')
+    # bool is an int subclass, so JSON true/false would pass as 1/0
+    if isinstance(score, bool) or not isinstance(score, int) or not (1 <= score <= 10):
+        return error(400, "Rating must be an integer between 1 and 10")
+
+    try:
+        success, message = await write('rating', user_id, movie_id, score)
+    except write_queue.WriteQueueFullError as e:
+        return web.json_response({'error': str(e)}, status=503, headers={'Retry-After': '1'})
+    if not success:
+        return error(400, message)
+    return web.json_response({'message': message})
+
+
+async def submit_review(request):
+    user_id = await authenticate(request)
+    movie_id = movie_id_param(request)
+    body = await read_json(request)
+    text = body.get('text')
+    if not isinstance(text, str) or len(text.strip()) < 20:
+        return error(400, "Review must be at least 20 characters long")
+    text = text.strip()
+
+    try:
+        success, message = await write('review', user_id, movie_id, text)
+    except write_queue.WriteQueueFullError as e:
+        return web.json_response({'error': str(e)}, status=503, headers={'Retry-After': '1'})
+    if not success:
+        return error(409, message)
+
+    try:
+        (label, score), = await score_sentiments([text])
+    except (inference_queue.QueueFullError, RuntimeError):
+        # The review is stored; sentiment is filled in later by backfill_sentiment.py
+        label, score = None, None
+    if score is not None:
+        review_id = await run_db(database.get_user_review_id, user_id, movie_id)
+        if review_id is not None:
+            await run_db(database.set_review_sentiment, review_id, label, score)
+    return web.json_response({'message': message, 'sentiment': label}, status=201)
+
+
+async def register(request):
+    body = await read_json(request)
+    username = str(body.get('username', '')).strip()
+    password = str(body.get('password', ''))
+    if len(username) < 3:
+        return error(400, "Username must be at least 3 characters long")
+    if len(password) < 6:
+        return error(400, "Password must be at least 6 characters long")
+
+    success, message = await run_db(auth.register_user, username, password)
+    if not success:
+        return error(409, message)
+    return web.json_response({'message': message}, status=201)
+
+
+async def login(request):
+    body = await read_json(request)
+    success, result = await run_db(auth.verify_login, str(body.get('username', '')), str(body.get('password', '')))
+    if not success:
+        return error(401, result)
+    user_id = result
+    success, result = await run_db(auth.create_session, user_id)
+    if not success:
+        return error(500, result)
+    return web.json_response({'user_id': user_id, 'token': result, 'expires_in': auth.SESSION_TTL})
+
+
+async def logout(request):
+    token = bearer_token(request)
+    if token is None:
+        return error(400, "Send the session token as Authorization: Bearer <token>")
+    success, message = await run_db(auth.revoke_session, token)
+    if not success:
+        return error(401, message)
+    return web.json_response({'message': message})
+
+
+async def score_texts(request):
+    body = await read_json(request)
+    if 'texts' in body:
+        texts = body['texts']
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            return error(400, "texts must be a list of strings")
+        if len(texts) > MAX_SENTIMENT_BATCH:
+            return error(400, f"At most {MAX_SENTIMENT_BATCH} texts per request")
+    elif isinstance(body.get('text'), str):
+        texts = [body['text']]
+    else:
+        return error(400, "Provide text or texts")
+
+    # Texts join the shared queue and are batched with other clients' requests
+    try:
+        results = await score_sentiments(texts)
+    except inference_queue.QueueFullError as e:
+        return web.json_response({'error': str(e)}, status=503, headers={'Retry-After': '1'})
+    except RuntimeError as e:
+        return error(503, str(e))
+    scored = [{'label': label, 'score': score} for label, score in results]
+    if 'texts' in body:
+        return web.json_response({'results': scored})
+    return web.json_response(scored[0])
+
+
+async def dashboard_stats(request):
+    genre = request.query.get('genre') or None
+    summary = await run_db(stats.get_stats, genre)
+    if summary is None:
+        return error(503, "Statistics are unavailable")
+    return web.json_response(summary)
+
+
+async def metrics_report(request):
+    return web.json_response({
+        'enabled': metrics.ENABLED,
+        'metrics': metrics.snapshot(),
+        'inference_queue': inference_queue.get_batcher().stats(),
+        'inference_cache': sentiment.inference_cache.stats(),
+        'write_queue': write_queue.stats() if write_queue.ENABLED else None,
+        'session_cache': auth.session_cache.stats(),
+        'login_cache': auth.login_cache.stats(),
+    })
+
+
+@web.middleware
+async def timeout_middleware(request, handler):
+    """Answer 504 when a database call exceeds its timeout"""
+    try:
+        return await handler(request)
+    except asyncio.TimeoutError:
+        return error(504, "Database request timed out")
+
+
+def create_app():
+    """Build the aiohttp application"""
+    app = web.Application(middlewares=[timeout_middleware])
+    app.add_routes([
+        web.get('/api/movies', list_movies),
+        web.get('/api/movies/{movie_id}', movie_details),
+        web.get('/api/movies/{movie_id}/reviews', movie_reviews),
+        web.get('/api/movies/{movie_id}/rating-trend', movie_rating_trend),
+        web.post('/api/movies/{movie_id}/rating', submit_rating),
+        web.post('/api/movies/{movie_id}/reviews', submit_review),
+        web.post('/api/register', register),
+        web.post('/api/login', login),
+        web.post('/api/logout', logout),
+        web.post('/api/sentiment', score_texts),
+        web.get('/api/stats', dashboard_stats),
+        web.get('/api/metrics', metrics_report),
+    ])
+
+    async def shutdown(app):
+        # Commit queued writes before the process exits
+        if write_queue.ENABLED:
+            write_queue.shutdown()
+        async_database.shutdown()
+        inference_queue.get_batcher().shutdown()
+    app.on_cleanup.append(shutdown)
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the MTIP HTTP API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=0,
+                        help="forked sentiment worker processes sharing the model (0 runs inference in-process)")
+    args = parser.parse_args()
+
+    conn = database.create_connection()
+    if conn is None:
+        raise SystemExit("Error! Cannot create the database connection.")
+    database.create_tables(conn)
+    conn.close()
+
+    # Fork inference workers before any threads start
+    if args.workers > 0:
+        import sentiment
+        if not sentiment.start_worker_pool(args.workers):
+            print("Sentiment worker pool unavailable; running inference in-process")
+
+    web.run_app(create_app(), host=args.host, port=args.port)
@@ -0,0 +1,165 @@
+# async_database.py
+"""Async counterparts of the database.py and auth.py calls.
+
+Each coroutine runs the blocking function on a dedicated DB thread pool
+(MTIP_DB_WORKERS threads), so asyncio front ends need no run_in_executor
+boilerplate. On top of the pool:
+
+    concurrency limit  at most MTIP_DB_CONCURRENCY calls are queued or running;
+                       further callers wait on a semaphore instead of piling
+                       up work in the executor
+    timeouts           every call takes timeout= (default MTIP_DB_TIMEOUT
+                       seconds, 0 for none) and raises asyncio.TimeoutError
+    cancellation       a cancelled or timed-out call that has not started is
+                       dropped; one that is running has its SQLite queries
+                       interrupted through sqlite3.Connection.interrupt()
+
+Results are the same as the sync functions. An interrupted query surfaces the
+way the sync function reports errors (e.g. (False, "Error ...") or None), but
+callers only see it if they did not cancel.
+"""
+import asyncio
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from sqlite3 import ProgrammingError
+
+import auth
+import database
+
+DB_WORKERS = int(os.environ.get("MTIP_DB_WORKERS", "16"))
+DB_CONCURRENCY = int(os.environ.get("MTIP_DB_CONCURRENCY", str(DB_WORKERS * 4)))
+DB_TIMEOUT = float(os.environ.get("MTIP_DB_TIMEOUT", "10"))
+
+executor = ThreadPoolExecutor(DB_WORKERS, thread_name_prefix='db')
+_semaphores = weakref.WeakKeyDictionary()
+
+
+class Call:
+    """One function call on the pool, with the connections it opened"""
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self.connections = []
+        self.cancelled = False
+
+    def run(self):
+        if self.cancelled:
+            raise asyncio.CancelledError()
+        database.track_connections(self.connections)
+        try:
+            return self.func(*self.args)
+        finally:
+            database.track_connections(None)
+
+    def interrupt(self):
+        """Abort the running queries of this call (safe from any thread)"""
+        self.cancelled = True
+        for conn in list(self.connections):
+            try:
+                conn.interrupt()
+            except ProgrammingError:
+                pass  # Already closed
+
+
+def semaphore():
+    """Concurrency limit for the running event loop"""
+    loop = asyncio.get_running_loop()
+    sem = _semaphores.get(loop)
+    if sem is None:
+        sem = _semaphores[loop] = asyncio.Semaphore(DB_CONCURRENCY)
+    return sem
+
+
+async def run(func, *args, timeout=None):
+    """Run a blocking database or auth call on the DB pool"""
+    timeout = DB_TIMEOUT if timeout is None else timeout
+    async with semaphore():
+        call = Call(func, args)
+        future = asyncio.get_running_loop().run_in_executor(executor, call.run)
+        try:
+            return await asyncio.wait_for(future, timeout or None)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            call.interrupt()
+            raise
+
+
+async def get_all_movies(timeout=None):
+    return await run(database.get_all_movies, timeout=timeout)
+
+
+async def search_movies(query='', limit=50, offset=0, timeout=None):
+    return await run(database.search_movies, query, limit, offset, timeout=timeout)
+
+
+async def get_movies_by_ids(movie_ids, timeout=None):
+    return await run(database.get_movies_by_ids, movie_ids, timeout=timeout)
+
+
+async def get_movie_details(movie_id, timeout=None):
+    return await run(database.get_movie_details, movie_id, timeout=timeout)
+
+
+async def add_rating(user_id, movie_id, score, timeout=None):
+    return await run(database.add_rating, user_id, movie_id, score, timeout=timeout)
+
+
+async def get_user_rating(user_id, movie_id, timeout=None):
+    return await run(database.get_user_rating, user_id, movie_id, timeout=timeout)
+
+
+async def get_movie_ratings(movie_id, timeout=None):
+    return await run(database.get_movie_ratings, movie_id, timeout=timeout)
+
+
+async def get_movie_rating_trend(movie_id, weeks=None, timeout=None):
+    return await run(database.get_movie_rating_trend, movie_id, weeks, timeout=timeout)
+
+
+async def add_review(user_id, movie_id, review_text, timeout=None):
+    return await run(database.add_review, user_id, movie_id, review_text, timeout=timeout)
+
+
+async def get_user_review(user_id, movie_id, timeout=None):
+    return await run(database.get_user_review, user_id, movie_id, timeout=timeout)
+
+
+async def get_user_review_id(user_id, movie_id, timeout=None):
+    return await run(database.get_user_review_id, user_id, movie_id, timeout=timeout)
+
+
+async def get_movie_reviews(movie_id, timeout=None):
+    return await run(database.get_movie_reviews, movie_id, timeout=timeout)
+
+
+async def set_review_sentiment(review_id, label, score, timeout=None):
+    return await run(database.set_review_sentiment, review_id, label, score, timeout=timeout)
+
+
+async def get_movie_sentiment_summary(movie_id, timeout=None):
+    return await run(database.get_movie_sentiment_summary, movie_id, timeout=timeout)
+
+
+async def register_user(username, password, timeout=None):
+    return await run(auth.register_user, username, password, timeout=timeout)
+
+
+async def verify_login(username, password, timeout=None):
+    return await run(auth.verify_login, username, password, timeout=timeout)
+
+
+async def create_session(user_id, timeout=None):
+    return await run(auth.create_session, user_id, timeout=timeout)
+
+
+async def verify_session(token, timeout=None):
+    return await run(auth.verify_session, token, timeout=timeout)
+
+
+async def revoke_session(token, timeout=None):
+    return await run(auth.revoke_session, token, timeout=timeout)
+
+
+def shutdown():
+    """Wait for running calls and stop the DB pool"""
+    executor.shutdown(wait=True)
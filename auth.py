@@ -1,6 +1,66 @@
+import base64
 import bcrypt
+import hashlib
+import hmac
+import os
+import secrets
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from database import create_connection
+import metrics
+
+SESSION_TTL = int(os.environ.get("MTIP_SESSION_TTL", str(7 * 24 * 3600)))  # Seconds a session token is valid
+SESSION_RECHECK = int(os.environ.get("MTIP_SESSION_RECHECK", "60"))  # Seconds a cached session skips the revocation check
+AUTH_CACHE_SIZE = int(os.environ.get("MTIP_AUTH_CACHE_SIZE", "10000"))  # Max cached sessions and logins, 0 disables
+
+class AuthCache:
+    """Size-bounded LRU shared by request threads"""
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries over max_size"""
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def stats(self):
+        """Return hits, misses and size"""
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+# session_id -> (user_id, expires_at, last checked against the sessions table)
+session_cache = AuthCache(AUTH_CACHE_SIZE)
+# username -> (user_id, HMAC of the password that passed bcrypt), so repeat logins skip bcrypt
+login_cache = AuthCache(AUTH_CACHE_SIZE)
+
+_session_key = None
+_session_key_lock = threading.Lock()
 
 def hash_password(password):
     """Hash a password using bcrypt"""
@@ -11,6 +71,7 @@ def verify_password(password, hashed):
     """Verify a password against its hash"""
     return bcrypt.checkpw(password.encode('utf-8'), hashed)
 
+@metrics.instrument('auth.register_user')
 def register_user(username, password):
     """Register a new user"""
     conn = create_connection()
@@ -39,8 +100,48 @@ def register_user(username, password):
     finally:
         conn.close()
 
+def session_key():
+    """Secret for signing tokens: MTIP_SESSION_SECRET, or a random key kept in the database"""
+    global _session_key
+    if _session_key is not None:
+        return _session_key
+    with _session_key_lock:
+        if _session_key is not None:
+            return _session_key
+        if os.environ.get("MTIP_SESSION_SECRET"):
+            _session_key = os.environ["MTIP_SESSION_SECRET"].encode('utf-8')
+            return _session_key
+        conn = create_connection()
+        if conn is None:
+            raise sqlite3.Error("Database connection failed")
+        try:
+            # First process to get here picks the key; the others read it
+            conn.execute(
+                "INSERT OR IGNORE INTO auth_secrets (name, secret) VALUES ('session', ?)",
+                (secrets.token_bytes(32),)
+            )
+            conn.commit()
+            _session_key = conn.execute("SELECT secret FROM auth_secrets WHERE name = 'session'").fetchone()[0]
+        finally:
+            conn.close()
+        return _session_key
+
+def sign(message):
+    """URL-safe HMAC-SHA256 of message under the session key"""
+    digest = hmac.new(session_key(), message.encode('utf-8'), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+@metrics.instrument('auth.verify_login')
 def verify_login(username, password):
     """Verify user login credentials"""
+    try:
+        password_tag = sign(f"login\0{username}\0{password}")
+    except sqlite3.Error as e:
+        return False, f"Database error: {str(e)}"
+    cached = login_cache.get(username)
+    if cached is not None and hmac.compare_digest(cached[1], password_tag):
+        return True, cached[0]
+    
     conn = create_connection()
     if conn is None:
         return False, "Database connection failed"
@@ -59,9 +160,118 @@ def verify_login(username, password):
         user_id, stored_hash = user_data
         
         if verify_password(password, stored_hash):
+            login_cache.put(username, (user_id, password_tag))
             return True, user_id
         return False, "Invalid username or password"
     except sqlite3.Error as e:
         return False, f"Database error: {str(e)}"
+    finally:
+        conn.close()
+
+@metrics.instrument('auth.create_session')
+def create_session(user_id):
+    """Start a session for a logged-in user; returns (True, token) or (False, message)
+
+    The token is "<session id>.<user id>.<expiry>.<signature>", so it can be
+    checked with one HMAC instead of bcrypt.
+    """
+    session_id = secrets.token_urlsafe(16)
+    expires_at = int(time.time()) + SESSION_TTL
+    conn = create_connection()
+    if conn is None:
+        return False, "Database connection failed"
+    
+    try:
+        payload = f"{session_id}.{user_id}.{expires_at}"
+        token = f"{payload}.{sign(payload)}"
+        conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (int(time.time()),))
+        conn.execute(
+            'INSERT INTO sessions (session_id, user_id, expires_at) VALUES (?, ?, ?)',
+            (session_id, user_id, expires_at)
+        )
+        conn.commit()
+        session_cache.put(session_id, (user_id, expires_at, time.monotonic()))
+        return True, token
+    except sqlite3.Error as e:
+        return False, f"Database error: {str(e)}"
+    finally:
+        conn.close()
+
+def parse_token(token):
+    """(session_id, user_id, expires_at) of a correctly signed token, or None"""
+    # Genuine tokens are ASCII; compare_digest rejects non-ASCII str with TypeError
+    if not token.isascii():
+        return None
+    parts = token.split('.')
+    if len(parts) != 4:
+        return None
+    session_id, user_id, expires_at, signature = parts
+    if not hmac.compare_digest(sign(f"{session_id}.{user_id}.{expires_at}"), signature):
+        return None
+    try:
+        return session_id, int(user_id), int(expires_at)
+    except ValueError:
+        return None
+
+@metrics.instrument('auth.verify_session')
+def verify_session(token):
+    """Check a session token; returns (True, user_id) or (False, message)"""
+    try:
+        parsed = parse_token(token)
+    except sqlite3.Error as e:
+        return False, f"Database error: {str(e)}"
+    if parsed is None:
+        return False, "Invalid session token"
+    session_id, user_id, expires_at = parsed
+    if expires_at <= time.time():
+        session_cache.pop(session_id)
+        return False, "Session expired"
+    
+    # Signed tokens are trusted until revoked; the table is consulted at most every SESSION_RECHECK seconds
+    cached = session_cache.get(session_id)
+    if cached is not None and time.monotonic() - cached[2] < SESSION_RECHECK:
+        return True, user_id
+    
+    conn = create_connection()
+    if conn is None:
+        return False, "Database connection failed"
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT 1 FROM sessions WHERE session_id = ? AND user_id = ? AND expires_at > ?',
+            (session_id, user_id, int(time.time()))
+        )
+        if cursor.fetchone() is None:
+            session_cache.pop(session_id)
+            return False, "Session expired"
+        session_cache.put(session_id, (user_id, expires_at, time.monotonic()))
+        return True, user_id
+    except sqlite3.Error as e:
+        return False, f"Database error: {str(e)}"
+    finally:
+        conn.close()
+
+@metrics.instrument('auth.revoke_session')
+def revoke_session(token):
+    """End the session of a token (logout)"""
+    try:
+        parsed = parse_token(token)
+    except sqlite3.Error as e:
+        return False, f"Database error: {str(e)}"
+    if parsed is None:
+        return False, "Invalid session token"
+    session_id = parsed[0]
+    session_cache.pop(session_id)
+    conn = create_connection()
+    if conn is None:
+        return False, "Database connection failed"
+    
+    try:
+        conn.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+        conn.commit()
+        return True, "Logged out"
+    except sqlite3.Error as e:
+        return False, f"Database error: {str(e)}"
     finally:
         conn.close()
\ No newline at end of file
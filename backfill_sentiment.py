@@ -0,0 +1,120 @@
+# backfill_sentiment.py
+"""Score every review that has no persisted sentiment yet.
+
+Reviews are streamed from SQLite in id-ordered chunks, scored in batches by
+sentiment.py's worker pool (forked workers sharing one copy of the model),
+and written back in one transaction per chunk together with the job
+checkpoint, so an interrupted run resumes where it stopped. With sharded
+storage the shards are processed one after another, each with its own
+checkpoint.
+
+Usage:
+    python backfill_sentiment.py [--workers N] [--chunk-size N] [--batch-size N] [--reset]
+"""
+import argparse
+import os
+import time
+
+import database
+
+JOB_NAME = 'sentiment_backfill'
+
+
+def format_duration(seconds):
+    """Format a duration in seconds as H:MM:SS"""
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def run_backfill(workers, chunk_size, batch_size, reset=False):
+    """Score all unscored reviews, resuming from the last checkpoint"""
+    conn = database.create_connection()
+    if conn is None:
+        print("Error! Cannot create the database connection.")
+        return False
+    database.create_tables(conn)
+    conn.close()
+
+    # One pass per shard (or over the main database), each with its own checkpoint.
+    # Shard connections attach the main database, so the checkpoint commits with the results.
+    passes = []
+    total = 0
+    for shard in database.shard_ids():
+        conn = database.create_shard_connection(shard)
+        if conn is None:
+            print("Error! Cannot create the database connection.")
+            for conn, _, _ in passes:
+                conn.close()
+            return False
+        conn.execute("PRAGMA synchronous = NORMAL")
+        job_name = database.shard_job_name(JOB_NAME, shard)
+        if reset:
+            database.set_checkpoint(conn, job_name, 0)
+            conn.commit()
+        last_id = database.get_checkpoint(conn, job_name)
+        total += database.count_unscored_reviews(conn, last_id)
+        passes.append((conn, job_name, last_id))
+    print(f"Resuming after review_id {', '.join(str(p[2]) for p in passes)}: {total} reviews to score")
+    if total == 0:
+        for conn, _, _ in passes:
+            conn.close()
+        return True
+
+    # Load the model once here; forked workers share it
+    import sentiment
+    if workers > 0 and not sentiment.start_worker_pool(workers):
+        print("Worker pool unavailable (GPU or no fork support); scoring in this process")
+
+    done = 0
+    start = time.monotonic()
+    try:
+        for conn, job_name, last_id in passes:
+            while True:
+                rows = database.get_unscored_reviews(conn, last_id, chunk_size)
+                if not rows:
+                    break
+
+                results = sentiment.predict_sentiments([text for _, text in rows], batch_size=batch_size)
+                scored = [(review_id, label, score) for (review_id, _), (label, score) in zip(rows, results)]
+
+                # Results and checkpoint commit together so a crash never skips rows
+                last_id = rows[-1][0]
+                database.save_review_sentiments(conn, scored)
+                database.set_checkpoint(conn, job_name, last_id)
+                conn.commit()
+
+                done += len(rows)
+                elapsed = time.monotonic() - start
+                rate = done / elapsed if elapsed > 0 else 0
+                eta = (total - done) / rate if rate > 0 else 0
+                print(f"{done}/{total} reviews ({done / total:.1%}) "
+                      f"{rate:.1f} reviews/s, elapsed {format_duration(elapsed)}, ETA {format_duration(max(eta, 0))}")
+    except KeyboardInterrupt:
+        print(f"Interrupted; checkpoint saved at review_id {last_id}")
+        return False
+    except Exception as e:
+        print(f"Error during sentiment backfill: {e}")
+        return False
+    finally:
+        sentiment.stop_worker_pool()
+        for conn, _, _ in passes:
+            conn.close()
+
+    print(f"Scored {done} reviews in {format_duration(time.monotonic() - start)}")
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Persist sentiment for all unscored reviews")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="worker processes (0 scores in this process, e.g. on a GPU)")
+    parser.add_argument('--chunk-size', type=int, default=10000,
+                        help="reviews read and committed per transaction")
+    parser.add_argument('--batch-size', type=int, default=64,
+                        help="reviews per model forward pass")
+    parser.add_argument('--reset', action='store_true',
+                        help="ignore the saved checkpoint and rescan from the first review")
+    args = parser.parse_args()
+
+    ok = run_backfill(args.workers, args.chunk_size, args.batch_size, args.reset)
+    raise SystemExit(0 if ok else 1)
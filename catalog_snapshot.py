@@ -0,0 +1,310 @@
+# catalog_snapshot.py
+"""Memory-mapped columnar snapshot of the movie catalog.
+
+Numeric columns are stored as .npy files and strings as a UTF-8 heap plus an
+int64 offsets array (row i is heap[offsets[i]:offsets[i + 1]]). Everything is
+opened memory-mapped, so opening a snapshot costs the same for ten movies or
+ten million, and listing and title search run on the arrays without
+copying them into Python objects first. Rows become Python tuples only for
+the slice a caller asks for, so the GUI can fill its Treeview a page at a
+time.
+
+meta.json records the highest movie_id and the rating change log position
+of every shard at export time. When movies were added the snapshot is stale
+until re-exported; when only ratings changed, the user rating columns are
+brought up to date from the change log entries since those positions and
+swapped in as a new snapshot, without re-reading the movies table.
+
+Usage:
+    python catalog_snapshot.py    # (re)export the snapshot from movie_review.db
+"""
+import json
+import mmap
+import os
+import shutil
+import time
+
+import numpy as np
+
+import database
+
+SNAPSHOT_DIR = 'catalog_snapshot'
+STRING_COLUMNS = ('title', 'genre')
+SEARCH_SEPARATOR = b'\x00'  # Ends each title in the search heap so matches never span rows
+CURRENT_CHECK_INTERVAL = float(os.environ.get("MTIP_SNAPSHOT_RECHECK", "5"))  # Seconds between database checks
+RATING_COLUMNS = ('user_rating_avg', 'user_rating_count', 'user_rating_sum')
+
+
+def write_heap(path, values):
+    """Write strings as a UTF-8 heap and return their offsets"""
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    with open(path, 'wb') as f:
+        position = 0
+        for i, value in enumerate(values):
+            encoded = value.encode('utf-8')
+            f.write(encoded)
+            position += len(encoded)
+            offsets[i + 1] = position
+    return offsets
+
+
+def rating_columns(counts, sums):
+    """Per-movie user rating columns from rating counts and score sums"""
+    counts = np.asarray(counts, dtype=np.int64)
+    sums = np.asarray(sums, dtype=np.int64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = np.where(counts > 0, sums / counts, np.nan)
+    return {
+        'user_rating_avg': averages.astype(np.float32),
+        'user_rating_count': counts.astype(np.int32),
+        'user_rating_sum': sums,
+    }
+
+
+def start_staging(snapshot_dir):
+    """Empty staging directory for a new export, clearing what an interrupted export left behind"""
+    for leftover in (f"{snapshot_dir}.tmp", f"{snapshot_dir}.old"):
+        if os.path.isdir(leftover):
+            shutil.rmtree(leftover)
+    staging_dir = f"{snapshot_dir}.tmp"
+    os.makedirs(staging_dir)
+    return staging_dir
+
+
+def publish(staging_dir, snapshot_dir):
+    """Swap a complete staging directory in as the snapshot"""
+    if os.path.isdir(snapshot_dir):
+        old_dir = f"{snapshot_dir}.old"
+        os.replace(snapshot_dir, old_dir)
+        os.replace(staging_dir, snapshot_dir)
+        shutil.rmtree(old_dir)
+    else:
+        os.replace(staging_dir, snapshot_dir)
+
+
+def export_snapshot(conn, snapshot_dir=SNAPSHOT_DIR):
+    """Export the movies table and rating aggregates to snapshot_dir"""
+    try:
+        c = conn.cursor()
+        c.execute('''
+            SELECT movie_id, series_title, released_year, imdb_rating, genre, no_of_votes
+            FROM movies ORDER BY movie_id
+        ''')
+        rows = c.fetchall()
+        # Rating aggregates come from every shard (or the main database) in parallel
+        totals, positions = database.get_movie_rating_totals()
+        ratings = [totals.get(r[0], (0, 0)) for r in rows]
+
+        # Export into a fresh directory and swap it in, so readers never see a mix
+        staging_dir = start_staging(snapshot_dir)
+        path = lambda name: os.path.join(staging_dir, name)
+
+        columns = {
+            'movie_id': np.array([r[0] for r in rows], dtype=np.int64),
+            'released_year': np.array([r[2] if r[2] is not None else -1 for r in rows], dtype=np.int32),
+            'imdb_rating': np.array([r[3] if r[3] is not None else np.nan for r in rows], dtype=np.float64),
+            'no_of_votes': np.array([r[5] or 0 for r in rows], dtype=np.int64),
+        }
+        columns.update(rating_columns([r[0] for r in ratings], [r[1] or 0 for r in ratings]))
+        for name, column in columns.items():
+            np.save(path(f"{name}.npy"), column)
+
+        for name, values in (('title', [r[1] or '' for r in rows]), ('genre', [r[4] or '' for r in rows])):
+            np.save(path(f"{name}_offsets.npy"), write_heap(path(f"{name}.bin"), values))
+        search_values = [(r[1] or '').lower() + SEARCH_SEPARATOR.decode() for r in rows]
+        np.save(path("title_search_offsets.npy"), write_heap(path("title_search.bin"), search_values))
+
+        with open(path('meta.json'), 'w') as f:
+            json.dump({
+                'rows': len(rows),
+                'max_movie_id': int(columns['movie_id'][-1]) if rows else 0,
+                'rating_positions': positions,
+                'exported_at': time.time(),
+            }, f)
+
+        publish(staging_dir, snapshot_dir)
+        print(f"Exported catalog snapshot with {len(rows)} movies")
+        return True
+    except Exception as e:
+        print(f"Error exporting catalog snapshot: {e}")
+        return False
+
+
+def refresh_ratings(snapshot, snapshot_dir=SNAPSHOT_DIR):
+    """Export a copy of snapshot whose user rating columns include the ratings changed since it was made
+
+    The other files are hard-linked into the new snapshot rather than copied.
+    """
+    try:
+        deltas, positions = database.get_movie_rating_deltas(snapshot.meta['rating_positions'])
+        movie_ids = snapshot.columns['movie_id']
+        counts = np.array(snapshot.columns['user_rating_count'], dtype=np.int64)
+        sums = np.array(snapshot.columns['user_rating_sum'], dtype=np.int64)
+        if deltas:
+            changed = np.fromiter(deltas, dtype=np.int64, count=len(deltas))
+            rows = np.searchsorted(movie_ids, changed)
+            found = rows < len(movie_ids)
+            found[found] = movie_ids[rows[found]] == changed[found]
+            values = np.array(list(deltas.values()), dtype=np.int64)
+            np.add.at(counts, rows[found], values[found, 0])
+            np.add.at(sums, rows[found], values[found, 1])
+
+        staging_dir = start_staging(snapshot_dir)
+        for name in os.listdir(snapshot_dir):
+            if name != 'meta.json' and name[:-4] not in RATING_COLUMNS:
+                os.link(os.path.join(snapshot_dir, name), os.path.join(staging_dir, name))
+        for name, column in rating_columns(counts, sums).items():
+            np.save(os.path.join(staging_dir, f"{name}.npy"), column)
+        with open(os.path.join(staging_dir, 'meta.json'), 'w') as f:
+            json.dump(dict(snapshot.meta, rating_positions=positions, exported_at=time.time()), f)
+        publish(staging_dir, snapshot_dir)
+        return True
+    except Exception as e:
+        print(f"Error refreshing catalog snapshot ratings: {e}")
+        return False
+
+
+def read_database_state():
+    """(highest movie_id, [rating change log position per shard]) to compare with a snapshot's meta"""
+    conn = database.create_connection()
+    if conn is None:
+        raise database.Error("Cannot create the database connection")
+    try:
+        max_movie_id = conn.execute('SELECT COALESCE(MAX(movie_id), 0) FROM movies').fetchone()[0]
+    finally:
+        conn.close()
+    positions = database.map_shards(lambda shard, conn: conn.execute(database.LAST_CHANGE_ID).fetchone()[0])
+    return max_movie_id, positions
+
+
+def map_heap(path):
+    """Memory-map a string heap read-only (empty heaps cannot be mapped)"""
+    if os.path.getsize(path) == 0:
+        return b''
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class CatalogSnapshot:
+    """Read-only, memory-mapped view of an exported catalog snapshot"""
+    def __init__(self, snapshot_dir=SNAPSHOT_DIR):
+        path = lambda name: os.path.join(snapshot_dir, name)
+        self.meta_path = path('meta.json')
+        self.meta_mtime = os.stat(self.meta_path).st_mtime_ns
+        with open(self.meta_path) as f:
+            self.meta = json.load(f)
+        self.columns = {
+            name[:-4]: np.load(path(name), mmap_mode='r')
+            for name in os.listdir(snapshot_dir)
+            if name.endswith('.npy') and not name.endswith('_offsets.npy')
+        }
+        self.heaps = {}
+        for name in STRING_COLUMNS + ('title_search',):
+            self.heaps[name] = (map_heap(path(f"{name}.bin")), np.load(path(f"{name}_offsets.npy"), mmap_mode='r'))
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def is_replaced(self):
+        """True if a newer export has replaced the files this view maps"""
+        try:
+            return os.stat(self.meta_path).st_mtime_ns != self.meta_mtime
+        except FileNotFoundError:
+            return True
+
+    def is_current(self, state=None):
+        """True if no movies were added and no ratings changed since the export
+
+        state is a read_database_state() result; it is read when not given.
+        """
+        try:
+            max_movie_id, positions = state or read_database_state()
+        except database.Error as e:
+            print(f"Error checking catalog snapshot: {e}")
+            return False
+        return (max_movie_id == self.meta['max_movie_id']
+                and positions == self.meta.get('rating_positions'))
+
+    def string(self, column, i):
+        """Decode the string in row i of a string column"""
+        heap, offsets = self.heaps[column]
+        return heap[offsets[i]:offsets[i + 1]].decode('utf-8')
+
+    def list_rows(self, indices=None, start=0, stop=None):
+        """(movie_id, title, year, imdb_rating) tuples of indices[start:stop], like database.get_all_movies"""
+        if indices is None:
+            indices = np.arange(len(self))
+        indices = np.asarray(indices, dtype=np.int64)[start:stop]
+        years = self.columns['released_year'][indices].astype(object)
+        years[years < 0] = None
+        ratings = self.columns['imdb_rating'][indices]
+        missing = np.isnan(ratings)
+        ratings = ratings.astype(object)
+        ratings[missing] = None
+        heap, offsets = self.heaps['title']
+        titles = [heap[begin:end].decode('utf-8')
+                  for begin, end in zip(offsets[indices].tolist(), offsets[indices + 1].tolist())]
+        return list(zip(self.columns['movie_id'][indices].tolist(), titles, years.tolist(), ratings.tolist()))
+
+    def search(self, query):
+        """Row indices whose title contains query (case-insensitive), in catalog order"""
+        query = query.lower()
+        if not query:
+            return np.arange(len(self))
+        heap, offsets = self.heaps['title_search']
+        needle = query.encode('utf-8')
+        matches = []
+        position = heap.find(needle) if len(heap) else -1
+        while position != -1:
+            row = int(np.searchsorted(offsets, position, side='right')) - 1
+            matches.append(row)
+            # Resume at the next row so each title is reported once
+            position = heap.find(needle, int(offsets[row + 1]))
+        return np.array(matches, dtype=np.int64)
+
+
+_snapshot = None
+_checked_at = None
+
+
+def get_snapshot():
+    """Return the shared snapshot if it exists and matches the database, else None
+
+    The database is asked at most every CURRENT_CHECK_INTERVAL seconds; in
+    between, only the snapshot files are checked for a re-export.
+    """
+    global _snapshot, _checked_at
+    try:
+        due = _checked_at is None or time.monotonic() - _checked_at >= CURRENT_CHECK_INTERVAL
+        if _snapshot is not None and _snapshot.is_replaced():
+            # Re-exported since: map the files on disk again and check them now
+            _snapshot, due = None, True
+        if not due:
+            return _snapshot
+        _checked_at = time.monotonic()
+        if _snapshot is None:
+            _snapshot = CatalogSnapshot()
+        state = read_database_state()
+        if _snapshot.is_current(state):
+            return _snapshot
+        snapshot, _snapshot = _snapshot, None
+        # Only ratings changed: bring the rating columns up to date and map the result
+        if (state[0] == snapshot.meta['max_movie_id']
+                and len(state[1]) == len(snapshot.meta.get('rating_positions') or [])
+                and refresh_ratings(snapshot)):
+            _snapshot = CatalogSnapshot()
+        return _snapshot
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, database.Error) as e:
+        print(f"Catalog snapshot not available: {e}")
+        return None
+
+
+if __name__ == '__main__':
+    conn = database.create_connection()
+    if conn is not None:
+        export_snapshot(conn)
+        conn.close()
+    else:
+        print("Error! Cannot create the database connection.")
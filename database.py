@@ -1,21 +1,246 @@
+import os
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from sqlite3 import Error
-import pandas as pd
 import re
+import sys
+import threading
+import time
+import metrics
+import movie_fields
 
+DB_FILE = 'movie_review.db'
+
+# Storage mode: with MTIP_SHARDS=N > 1, ratings and reviews (with their sentiment
+# and change-log tables) are hash-partitioned by movie_id across N shard files.
+# Movies, users and batch-job state stay in DB_FILE, which every shard connection
+# attaches so joins against users and movies work unchanged.
+SHARDS = max(int(os.environ.get("MTIP_SHARDS", "1")), 1)
+SHARD_FILE = os.environ.get("MTIP_SHARD_FILE", "movie_review_shard{}.db")
+
+# Position of the rating change log: the last change_id handed out
+LAST_CHANGE_ID = "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'rating_changes'), 0)"
+
+_shard_executor = None
+_shard_executor_lock = threading.Lock()
+_connection_tracking = threading.local()
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that logs statements slower than MTIP_SLOW_QUERY_MS with their query plan"""
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        result = super().execute(sql, parameters)
+        elapsed = time.perf_counter() - start
+        if elapsed * 1000 >= metrics.SLOW_QUERY_MS:
+            metrics.log_slow_query(self.connection, sql, parameters, elapsed)
+        return result
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors (and execute shortcut) use TimedCursor"""
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+@metrics.instrument('database.create_connection')
 def create_connection():
     """Create a database connection to SQLite database"""
     conn = None
     try:
-        conn = sqlite3.connect('movie_review.db')
+        # Only pay for statement timing when the slow query log is on
+        factory = TimedConnection if metrics.SLOW_QUERY_MS > 0 else sqlite3.Connection
+        conn = sqlite3.connect(DB_FILE, factory=factory)
         # Enable foreign keys and set text factory to str to support Turkish characters
         conn.execute("PRAGMA foreign_keys = ON")
         conn.text_factory = str
+        track_connection(conn)
         return conn
     except Error as e:
+        metrics.record_error('database.create_connection')
         print(f"Error connecting to database: {e}")
     return conn
 
+def track_connections(connections):
+    """Append connections opened by this thread to the given list (None stops tracking)
+
+    Lets another thread interrupt the queries of a call in progress, see async_database.py.
+    """
+    _connection_tracking.connections = connections
+
+def track_connection(conn):
+    """Record a new connection for the current thread's tracker, if any"""
+    connections = getattr(_connection_tracking, 'connections', None)
+    if connections is not None:
+        connections.append(conn)
+
+def shard_for_movie(movie_id):
+    """Shard holding a movie's ratings and reviews (None when storage is not sharded)"""
+    if SHARDS == 1:
+        return None
+    return int(movie_id) % SHARDS
+
+def shard_for_review(review_id):
+    """Shard holding a review; sharded review ids are allocated congruent to their shard"""
+    if SHARDS == 1:
+        return None
+    return int(review_id) % SHARDS
+
+@metrics.instrument('database.create_shard_connection')
+def create_shard_connection(shard):
+    """Connect to a shard file with the main database attached (None: the main database)"""
+    if shard is None:
+        return create_connection()
+    conn = None
+    try:
+        factory = TimedConnection if metrics.SLOW_QUERY_MS > 0 else sqlite3.Connection
+        conn = sqlite3.connect(SHARD_FILE.format(shard), factory=factory)
+        # Foreign keys to users and movies cannot cross files, so they stay unenforced here
+        conn.execute("ATTACH DATABASE ? AS core", (DB_FILE,))
+        conn.text_factory = str
+        track_connection(conn)
+        return conn
+    except Error as e:
+        metrics.record_error('database.create_shard_connection')
+        print(f"Error connecting to shard {shard}: {e}")
+    return conn
+
+def shard_ids():
+    """Shards to iterate over in batch jobs ([None] when storage is not sharded)"""
+    return [None] if SHARDS == 1 else list(range(SHARDS))
+
+def shard_job_name(job_name, shard):
+    """Checkpoint name for a batch job's progress through one shard"""
+    return job_name if shard is None else f"{job_name}:shard{shard}"
+
+def map_shards(func):
+    """Run func(shard, conn) on every shard in parallel and return the results in shard order
+
+    Each call gets its own connection and must commit its own writes. Without
+    sharding, func runs once on a main database connection with shard None.
+    """
+    global _shard_executor
+    def run(shard):
+        conn = create_shard_connection(shard)
+        if conn is None:
+            raise Error(f"Cannot connect to shard {shard}")
+        try:
+            return func(shard, conn)
+        finally:
+            conn.close()
+
+    if SHARDS == 1:
+        return [run(None)]
+    with _shard_executor_lock:
+        if _shard_executor is None:
+            _shard_executor = ThreadPoolExecutor(SHARDS, thread_name_prefix='shard')
+    return list(_shard_executor.map(run, range(SHARDS)))
+
+@metrics.instrument('database.get_movie_rating_totals')
+def get_movie_rating_totals():
+    """({movie_id: (count, sum)} of user ratings, [change log position per shard]), aggregated per shard in parallel"""
+    def fetch(shard, conn):
+        c = conn.cursor()
+        c.execute('BEGIN')
+        try:
+            c.execute(LAST_CHANGE_ID)
+            position = c.fetchone()[0]
+            c.execute('SELECT movie_id, COUNT(*), SUM(score) FROM ratings GROUP BY movie_id')
+            return position, c.fetchall()
+        finally:
+            conn.rollback()
+    shard_totals = map_shards(fetch)
+    # Shards partition by movie_id, so per-shard groups never overlap
+    totals = {movie_id: (count, total) for _, rows in shard_totals for movie_id, count, total in rows}
+    return totals, [position for position, _ in shard_totals]
+
+@metrics.instrument('database.get_movie_rating_deltas')
+def get_movie_rating_deltas(positions):
+    """({movie_id: (count delta, sum delta)}, [new position per shard]) of ratings changed after positions"""
+    def fetch(shard, conn):
+        c = conn.cursor()
+        c.execute('BEGIN')
+        try:
+            c.execute(LAST_CHANGE_ID)
+            position = c.fetchone()[0]
+            c.execute('''
+                SELECT movie_id,
+                       SUM((new_score IS NOT NULL) - (old_score IS NOT NULL)),
+                       SUM(COALESCE(new_score, 0) - COALESCE(old_score, 0))
+                FROM rating_changes
+                WHERE change_id > ? AND change_id <= ?
+                GROUP BY movie_id
+            ''', (positions[shard or 0], position))
+            return position, c.fetchall()
+        finally:
+            conn.rollback()
+    shard_deltas = map_shards(fetch)
+    deltas = {movie_id: (count, total) for _, rows in shard_deltas for movie_id, count, total in rows}
+    return deltas, [position for position, _ in shard_deltas]
+
+def split_into_shards():
+    """Copy ratings and reviews from the main database into empty shard files
+
+    Reviews get new shard-congruent ids (their sentiment follows them). The
+    main database's copies are left in place, so unsetting MTIP_SHARDS goes
+    back to them. Run through `python database.py --split-shards`, which also
+    rebuilds the leaderboard and catalog snapshot.
+    """
+    def copy(shard, conn):
+        c = conn.cursor()
+        c.execute('SELECT (SELECT COUNT(*) FROM main.ratings) + (SELECT COUNT(*) FROM main.reviews)')
+        if c.fetchone()[0] > 0:
+            raise Error(f"Shard {shard} already holds data")
+        c.execute('''
+            INSERT INTO main.ratings (user_id, movie_id, score, timestamp)
+            SELECT user_id, movie_id, score, timestamp FROM core.ratings
+            WHERE movie_id % ? = ? ORDER BY rating_id
+        ''', (SHARDS, shard))
+        ratings = c.rowcount
+        # Replace the change log written by those inserts with the history, and its rollups
+        c.execute('DELETE FROM main.rating_changes')
+        c.execute('''
+            INSERT INTO main.rating_changes (movie_id, user_id, old_score, new_score, changed_at)
+            SELECT movie_id, user_id, old_score, new_score, changed_at FROM core.rating_changes
+            WHERE movie_id % ? = ? ORDER BY change_id
+        ''', (SHARDS, shard))
+        c.execute('DELETE FROM main.rating_weekly')
+        c.execute('''
+            INSERT INTO main.rating_weekly SELECT * FROM core.rating_weekly WHERE movie_id % ? = ?
+        ''', (SHARDS, shard))
+        c.execute('''
+            CREATE TEMP TABLE review_map AS
+            SELECT review_id AS old_id, ? + ? * ROW_NUMBER() OVER (ORDER BY review_id) AS new_id
+            FROM core.reviews WHERE movie_id % ? = ?
+        ''', (shard, SHARDS, SHARDS, shard))
+        c.execute('''
+            INSERT INTO main.reviews (review_id, user_id, movie_id, review_text, timestamp)
+            SELECT m.new_id, r.user_id, r.movie_id, r.review_text, r.timestamp
+            FROM core.reviews r JOIN review_map m ON m.old_id = r.review_id
+        ''')
+        reviews = c.rowcount
+        c.execute('''
+            INSERT INTO main.review_sentiment (review_id, label, score, scored_at)
+            SELECT m.new_id, s.label, s.score, s.scored_at
+            FROM core.review_sentiment s JOIN review_map m ON m.old_id = s.review_id
+        ''')
+        c.execute('DROP TABLE review_map')
+        conn.commit()
+        return ratings, reviews
+
+    if SHARDS == 1:
+        print("Set MTIP_SHARDS to the number of shards first")
+        return False
+    try:
+        for shard, (ratings, reviews) in enumerate(map_shards(copy)):
+            print(f"Shard {shard}: {ratings} ratings, {reviews} reviews")
+        return True
+    except Error as e:
+        metrics.record_error('database.split_into_shards')
+        print(f"Error splitting into shards: {e}")
+        return False
+
+@metrics.instrument('database.create_tables')
 def create_tables(conn):
     """Create the necessary tables in the database"""
     try:
@@ -69,136 +294,329 @@ def create_tables(conn):
             )
         ''')
         
-        # Create ratings table
+        # Create login sessions (tokens are signed with the key in auth_secrets, see auth.py)
         c.execute('''
-            CREATE TABLE IF NOT EXISTS ratings (
-                rating_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
                 user_id INTEGER NOT NULL,
-                movie_id INTEGER NOT NULL,
-                score INTEGER NOT NULL CHECK(score >= 1 AND score <= 10),
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id),
-                FOREIGN KEY (movie_id) REFERENCES movies (movie_id),
-                UNIQUE(user_id, movie_id)
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at INTEGER NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users (user_id)
             )
         ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS auth_secrets (
+                name TEXT PRIMARY KEY,
+                secret BLOB NOT NULL
+            )
+        ''')
+        
+        # Ratings, reviews and their derived tables (also created in every shard file)
+        create_rating_review_tables(conn)
         
-        # Create reviews table
+        # Create checkpoint table for resumable batch jobs
         c.execute('''
-            CREATE TABLE IF NOT EXISTS reviews (
-                review_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
+            CREATE TABLE IF NOT EXISTS job_checkpoints (
+                job_name TEXT PRIMARY KEY,
+                last_id INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Create precomputed leaderboard (maintained by leaderboard.py)
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS leaderboard (
+                movie_id INTEGER PRIMARY KEY,
+                decade INTEGER,
+                prior REAL NOT NULL,
+                app_count INTEGER NOT NULL DEFAULT 0,
+                app_sum INTEGER NOT NULL DEFAULT 0,
+                score REAL NOT NULL,
+                FOREIGN KEY (movie_id) REFERENCES movies (movie_id)
+            )
+        ''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_leaderboard_score ON leaderboard (score DESC)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_leaderboard_decade_score ON leaderboard (decade, score DESC)')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS leaderboard_genres (
+                genre TEXT NOT NULL,
                 movie_id INTEGER NOT NULL,
-                review_text TEXT NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id),
+                decade INTEGER,
+                score REAL NOT NULL,
+                PRIMARY KEY (genre, movie_id),
                 FOREIGN KEY (movie_id) REFERENCES movies (movie_id)
             )
         ''')
+        c.execute('''
+            CREATE INDEX IF NOT EXISTS idx_leaderboard_genres_score
+            ON leaderboard_genres (genre, score DESC)
+        ''')
+        c.execute('''
+            CREATE INDEX IF NOT EXISTS idx_leaderboard_genres_decade_score
+            ON leaderboard_genres (genre, decade, score DESC)
+        ''')
         
         conn.commit()
+        
+        if SHARDS > 1:
+            def create_shard_tables(shard, shard_conn):
+                create_rating_review_tables(shard_conn)
+                shard_conn.commit()
+            map_shards(create_shard_tables)
     except Error as e:
+        metrics.record_error('database.create_tables')
         print(f"Error creating tables: {e}")
 
-def parse_year(title):
-    """Extract year from title string"""
-    match = re.search(r'\((\d{4})\)', title)
-    return int(match.group(1)) if match else None
-
-def parse_title(title):
-    """Extract clean title from title string"""
-    # Remove ranking number and dot
-    title = re.sub(r'^\d+\.\s*', '', title)
-    # Remove year
-    title = re.sub(r'\(\d{4}\)', '', title)
-    return title.strip()
-
-def extract_director_and_stars(cast_text):
-    """Extract director and stars from cast text"""
-    director = ""
-    stars = ""
+def create_rating_review_tables(conn):
+    """Create ratings, reviews, their sentiment, change-log and rollup tables and triggers (caller commits)"""
+    c = conn.cursor()
     
-    if cast_text and isinstance(cast_text, str):
-        parts = cast_text.split(" | Stars: ")
-        if len(parts) > 0:
-            director = parts[0].replace("Director: ", "").strip()
-            if len(parts) > 1:
-                stars = parts[1].strip()
+    # Create ratings table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS ratings (
+            rating_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            movie_id INTEGER NOT NULL,
+            score INTEGER NOT NULL CHECK(score >= 1 AND score <= 10),
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (movie_id) REFERENCES movies (movie_id),
+            UNIQUE(user_id, movie_id)
+        )
+    ''')
     
-    return director, stars
-
-def parse_votes_and_gross(info):
-    """Extract votes and gross from info string"""
-    votes = 0
-    gross = ""
+    # Create reviews table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS reviews (
+            review_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            movie_id INTEGER NOT NULL,
+            review_text TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (movie_id) REFERENCES movies (movie_id)
+        )
+    ''')
     
-    if "Votes:" in info:
-        votes_match = re.search(r'Votes: ([\d,]+)', info)
-        if votes_match:
-            votes = int(votes_match.group(1).replace(',', ''))
+    # Create review sentiment table (filled by backfill_sentiment.py and on review submit)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS review_sentiment (
+            review_id INTEGER PRIMARY KEY,
+            label TEXT NOT NULL CHECK(label IN ('POSITIVE', 'NEUTRAL', 'NEGATIVE')),
+            score REAL,
+            scored_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (review_id) REFERENCES reviews (review_id) ON DELETE CASCADE
+        )
+    ''')
     
-    if "Gross:" in info:
-        gross_match = re.search(r'Gross: \$([\d.]+)M', info)
-        if gross_match:
-            gross = gross_match.group(1) + "M"
-            
-    return votes, gross
+    # Create per-movie sentiment aggregates, maintained by the triggers below
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS movie_sentiment_stats (
+            movie_id INTEGER PRIMARY KEY,
+            positive_count INTEGER NOT NULL DEFAULT 0,
+            neutral_count INTEGER NOT NULL DEFAULT 0,
+            negative_count INTEGER NOT NULL DEFAULT 0,
+            score_sum REAL NOT NULL DEFAULT 0,
+            score_count INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (movie_id) REFERENCES movies (movie_id)
+        )
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS review_sentiment_after_insert
+        AFTER INSERT ON review_sentiment
+        BEGIN
+            INSERT OR IGNORE INTO movie_sentiment_stats (movie_id)
+            SELECT movie_id FROM reviews WHERE review_id = NEW.review_id;
+            UPDATE movie_sentiment_stats SET
+                positive_count = positive_count + (NEW.label = 'POSITIVE'),
+                neutral_count = neutral_count + (NEW.label = 'NEUTRAL'),
+                negative_count = negative_count + (NEW.label = 'NEGATIVE'),
+                score_sum = score_sum + COALESCE(NEW.score, 0),
+                score_count = score_count + (NEW.score IS NOT NULL)
+            WHERE movie_id = (SELECT movie_id FROM reviews WHERE review_id = NEW.review_id);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS review_sentiment_after_update
+        AFTER UPDATE ON review_sentiment
+        BEGIN
+            UPDATE movie_sentiment_stats SET
+                positive_count = positive_count - (OLD.label = 'POSITIVE') + (NEW.label = 'POSITIVE'),
+                neutral_count = neutral_count - (OLD.label = 'NEUTRAL') + (NEW.label = 'NEUTRAL'),
+                negative_count = negative_count - (OLD.label = 'NEGATIVE') + (NEW.label = 'NEGATIVE'),
+                score_sum = score_sum - COALESCE(OLD.score, 0) + COALESCE(NEW.score, 0),
+                score_count = score_count - (OLD.score IS NOT NULL) + (NEW.score IS NOT NULL)
+            WHERE movie_id = (SELECT movie_id FROM reviews WHERE review_id = NEW.review_id);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS review_sentiment_after_delete
+        AFTER DELETE ON review_sentiment
+        BEGIN
+            UPDATE movie_sentiment_stats SET
+                positive_count = positive_count - (OLD.label = 'POSITIVE'),
+                neutral_count = neutral_count - (OLD.label = 'NEUTRAL'),
+                negative_count = negative_count - (OLD.label = 'NEGATIVE'),
+                score_sum = score_sum - COALESCE(OLD.score, 0),
+                score_count = score_count - (OLD.score IS NOT NULL)
+            WHERE movie_id = (SELECT movie_id FROM reviews WHERE review_id = OLD.review_id);
+        END
+    ''')
+    
+    # Seed aggregates for sentiment persisted before the stats table existed
+    c.execute('SELECT 1 FROM movie_sentiment_stats LIMIT 1')
+    if c.fetchone() is None:
+        rebuild_movie_sentiment_stats(conn)
+    
+    # Create ratings change log, appended to by the triggers below
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS rating_changes (
+            change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            movie_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            old_score INTEGER,
+            new_score INTEGER,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS ratings_after_insert
+        AFTER INSERT ON ratings
+        BEGIN
+            INSERT INTO rating_changes (movie_id, user_id, old_score, new_score)
+            VALUES (NEW.movie_id, NEW.user_id, NULL, NEW.score);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS ratings_after_update
+        AFTER UPDATE OF score ON ratings
+        BEGIN
+            INSERT INTO rating_changes (movie_id, user_id, old_score, new_score)
+            VALUES (NEW.movie_id, NEW.user_id, OLD.score, NEW.score);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS ratings_after_delete
+        AFTER DELETE ON ratings
+        BEGIN
+            INSERT INTO rating_changes (movie_id, user_id, old_score, new_score)
+            VALUES (OLD.movie_id, OLD.user_id, OLD.score, NULL);
+        END
+    ''')
+    
+    # Weekly per-movie rollups of the change log (weeks start on Monday), for trend charts
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rating_weekly'")
+    seed_weekly = c.fetchone() is None
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS rating_weekly (
+            movie_id INTEGER NOT NULL,
+            week TEXT NOT NULL,
+            events INTEGER NOT NULL DEFAULT 0,
+            given_count INTEGER NOT NULL DEFAULT 0,
+            given_sum INTEGER NOT NULL DEFAULT 0,
+            count_delta INTEGER NOT NULL DEFAULT 0,
+            sum_delta INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (movie_id, week)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS rating_changes_after_insert
+        AFTER INSERT ON rating_changes
+        BEGIN
+            INSERT INTO rating_weekly (
+                movie_id, week, events, given_count, given_sum, count_delta, sum_delta
+            )
+            VALUES (
+                NEW.movie_id, date(NEW.changed_at, '-6 days', 'weekday 1'), 1,
+                NEW.new_score IS NOT NULL, COALESCE(NEW.new_score, 0),
+                (NEW.new_score IS NOT NULL) - (NEW.old_score IS NOT NULL),
+                COALESCE(NEW.new_score, 0) - COALESCE(NEW.old_score, 0)
+            )
+            ON CONFLICT (movie_id, week) DO UPDATE SET
+                events = events + 1,
+                given_count = given_count + excluded.given_count,
+                given_sum = given_sum + excluded.given_sum,
+                count_delta = count_delta + excluded.count_delta,
+                sum_delta = sum_delta + excluded.sum_delta;
+        END
+    ''')
+    if seed_weekly:
+        rebuild_rating_weekly(conn)
+    
+    # One review per user and movie. Older databases may hold duplicates from the
+    # check-then-insert race, so keep each pair's first review before adding the index.
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_reviews_user_movie'")
+    if c.fetchone() is None:
+        duplicates = '''
+            SELECT review_id FROM reviews
+            WHERE review_id NOT IN (SELECT MIN(review_id) FROM reviews GROUP BY user_id, movie_id)
+        '''
+        # Sentiment rows go first so the stats triggers still see their review's movie
+        c.execute(f'DELETE FROM review_sentiment WHERE review_id IN ({duplicates})')
+        c.execute(f'DELETE FROM reviews WHERE review_id IN ({duplicates})')
+        if c.rowcount > 0:
+            print(f"Removed {c.rowcount} duplicate reviews")
+        c.execute('CREATE UNIQUE INDEX idx_reviews_user_movie ON reviews (user_id, movie_id)')
 
+@metrics.instrument('database.load_movies_from_csv')
 def load_movies_from_csv(conn, csv_file):
     """Load movie data from CSV file into the database"""
+    # pandas is only needed here; importing it lazily keeps app startup fast
+    import pandas as pd
     try:
         # Read CSV file
-        df = pd.read_csv(csv_file)
+        with metrics.timer('database.load_movies_from_csv.read_csv'):
+            df = pd.read_csv(csv_file)
         
         # Clear existing data
         c = conn.cursor()
-        c.execute('DELETE FROM movies')
+        with metrics.timer('database.load_movies_from_csv.clear'):
+            c.execute('DELETE FROM movies')
         
-        for _, row in df.iterrows():
-            # Parse title and year
-            title = parse_title(row['Title'].split('.', 1)[1].strip())
-            year = parse_year(row['Title'])
+        with metrics.timer('database.load_movies_from_csv.parse_insert'):
+            for _, row in df.iterrows():
+                # Title, year, director, stars, votes and gross in one call
+                title, year, director, stars, votes, gross = movie_fields.parse_movie_fields(
+                    row['Title'], row['Cast'], row['Info'])
             
-            # Parse director and stars
-            director, stars = extract_director_and_stars(row['Cast'])
             
-            # Parse votes and gross
-            votes, gross = parse_votes_and_gross(row['Info'])
-            
-            
-            c.execute('''
-                    INSERT OR IGNORE INTO movies (
-                        series_title, released_year, certificate, runtime,
-                        genre, imdb_rating, overview, director, stars,
-                        no_of_votes, gross
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    title, year, row['Certificate'], row['Duration'],
-                    row['Genre'], row['Rate'], row['Description'],
-                    director, stars, votes, gross
-                ))
-
-
-            # # Insert into database
-            # c.execute('''
-            #     INSERT INTO movies (
-            #         series_title, released_year, certificate, runtime,
-            #         genre, imdb_rating, overview, director, stars,
-            #         no_of_votes, gross
-            #     ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            # ''', (
-            #     title, year, row['Certificate'], row['Duration'],
-            #     row['Genre'], row['Rate'], row['Description'],
-            #     director, stars, votes, gross
-            # ))
+                c.execute('''
+                        INSERT OR IGNORE INTO movies (
+                            series_title, released_year, certificate, runtime,
+                            genre, imdb_rating, overview, director, stars,
+                            no_of_votes, gross
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (
+                        title, year, row['Certificate'], row['Duration'],
+                        row['Genre'], row['Rate'], row['Description'],
+                        director, stars, votes, gross
+                    ))
+
+
+                # # Insert into database
+                # c.execute('''
+                #     INSERT INTO movies (
+                #         series_title, released_year, certificate, runtime,
+                #         genre, imdb_rating, overview, director, stars,
+                #         no_of_votes, gross
+                #     ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                # ''', (
+                #     title, year, row['Certificate'], row['Duration'],
+                #     row['Genre'], row['Rate'], row['Description'],
+                #     director, stars, votes, gross
+                # ))
         
-        conn.commit()
+        with metrics.timer('database.load_movies_from_csv.commit'):
+            conn.commit()
         print(f"Successfully loaded {len(df)} movies into database")
     except Error as e:
+        metrics.record_error('database.load_movies_from_csv')
         print(f"Error loading movies data: {e}")
     except Exception as e:
+        metrics.record_error('database.load_movies_from_csv')
         print(f"Error processing data: {e}")
 
+@metrics.instrument('database.get_all_movies')
 def get_all_movies():
     """Fetch all movies from database"""
     conn = create_connection()
@@ -208,11 +626,57 @@ def get_all_movies():
             c.execute('SELECT movie_id, series_title, released_year, imdb_rating FROM movies')
             return c.fetchall()
         except Error as e:
+            metrics.record_error('database.get_all_movies')
             print(f"Error fetching movies: {e}")
         finally:
             conn.close()
     return []
 
+@metrics.instrument('database.search_movies')
+def search_movies(query='', limit=50, offset=0):
+    """Fetch a page of movies whose title contains query (case-insensitive)"""
+    conn = create_connection()
+    if conn is not None:
+        try:
+            c = conn.cursor()
+            c.execute('''
+                SELECT movie_id, series_title, released_year, imdb_rating FROM movies
+                WHERE series_title LIKE ? ESCAPE '\\'
+                ORDER BY movie_id
+                LIMIT ? OFFSET ?
+            ''', ('%' + re.sub(r'([%_\\])', r'\\\1', query) + '%', limit, offset))
+            return c.fetchall()
+        except Error as e:
+            metrics.record_error('database.search_movies')
+            print(f"Error searching movies: {e}")
+        finally:
+            conn.close()
+    return []
+
+@metrics.instrument('database.get_movies_by_ids')
+def get_movies_by_ids(movie_ids):
+    """Fetch list rows for the given movie ids, in the order given"""
+    if not movie_ids:
+        return []
+    conn = create_connection()
+    if conn is not None:
+        try:
+            c = conn.cursor()
+            placeholders = ','.join('?' * len(movie_ids))
+            c.execute(f'''
+                SELECT movie_id, series_title, released_year, imdb_rating
+                FROM movies WHERE movie_id IN ({placeholders})
+            ''', list(movie_ids))
+            rows = {row[0]: row for row in c.fetchall()}
+            return [rows[movie_id] for movie_id in movie_ids if movie_id in rows]
+        except Error as e:
+            metrics.record_error('database.get_movies_by_ids')
+            print(f"Error fetching movies: {e}")
+        finally:
+            conn.close()
+    return []
+
+@metrics.instrument('database.get_movie_details')
 def get_movie_details(movie_id):
     """Fetch detailed information for a specific movie"""
     conn = create_connection()
@@ -224,33 +688,68 @@ def get_movie_details(movie_id):
             ''', (movie_id,))
             return c.fetchone()
         except Error as e:
+            metrics.record_error('database.get_movie_details')
             print(f"Error fetching movie details: {e}")
         finally:
             conn.close()
     return None
 
+@metrics.instrument('database.insert_rating')
+def insert_rating(conn, user_id, movie_id, score):
+    """Add or update a rating on an open connection (caller commits)"""
+    # Upsert rather than REPLACE so the change log sees one update, not a hidden delete
+    conn.execute('''
+        INSERT INTO ratings (user_id, movie_id, score)
+        VALUES (?, ?, ?)
+        ON CONFLICT(user_id, movie_id) DO UPDATE SET
+            score = excluded.score,
+            timestamp = CURRENT_TIMESTAMP
+    ''', (user_id, movie_id, score))
+    return True, "Rating added successfully"
+
+@metrics.instrument('database.add_rating')
 def add_rating(user_id, movie_id, score):
     """Add or update a movie rating"""
-    conn = create_connection()
+    conn = create_shard_connection(shard_for_movie(movie_id))
     if conn is None:
         return False, "Database connection failed"
     
     try:
-        c = conn.cursor()
-        c.execute('''
-            INSERT OR REPLACE INTO ratings (user_id, movie_id, score)
-            VALUES (?, ?, ?)
-        ''', (user_id, movie_id, score))
+        result = insert_rating(conn, user_id, movie_id, score)
         conn.commit()
-        return True, "Rating added successfully"
+        return result
     except Error as e:
+        metrics.record_error('database.add_rating')
         return False, f"Error adding rating: {str(e)}"
     finally:
         conn.close()
 
+@metrics.instrument('database.get_user_review_id')
+def get_user_review_id(user_id, movie_id):
+    """Get the id of a user's review for a specific movie"""
+    conn = create_shard_connection(shard_for_movie(movie_id))
+    if conn is None:
+        return None
+    
+    try:
+        c = conn.cursor()
+        c.execute('''
+            SELECT review_id FROM reviews
+            WHERE user_id = ? AND movie_id = ?
+        ''', (user_id, movie_id))
+        result = c.fetchone()
+        return result[0] if result else None
+    except Error as e:
+        metrics.record_error('database.get_user_review_id')
+        print(f"Error getting user review id: {e}")
+        return None
+    finally:
+        conn.close()
+
+@metrics.instrument('database.get_user_review')
 def get_user_review(user_id, movie_id):
     """Get a user's review for a specific movie"""
-    conn = create_connection()
+    conn = create_shard_connection(shard_for_movie(movie_id))
     if conn is None:
         return None
     
@@ -263,38 +762,63 @@ def get_user_review(user_id, movie_id):
         result = c.fetchone()
         return result[0] if result else None
     except Error as e:
+        metrics.record_error('database.get_user_review')
         print(f"Error getting user review: {e}")
         return None
     finally:
         conn.close()
 
+@metrics.instrument('database.insert_review')
+def insert_review(conn, user_id, movie_id, review_text):
+    """Add a review on an open connection; (False, message) if the user already has one (caller commits)"""
+    c = conn.cursor()
+    shard = shard_for_movie(movie_id)
+    # The unique index makes this one statement both the check and the insert
+    if shard is None:
+        c.execute('''
+            INSERT INTO reviews (user_id, movie_id, review_text)
+            VALUES (?, ?, ?)
+            ON CONFLICT(user_id, movie_id) DO NOTHING
+        ''', (user_id, movie_id, review_text))
+    else:
+        # Keep review ids unique across shards: each shard allocates ids congruent to its number
+        c.execute('''
+            INSERT INTO reviews (review_id, user_id, movie_id, review_text)
+            VALUES ((SELECT COALESCE(MAX(review_id), ?) + ? FROM reviews), ?, ?, ?)
+            ON CONFLICT(user_id, movie_id) DO NOTHING
+        ''', (shard, SHARDS, user_id, movie_id, review_text))
+    if c.rowcount == 1:
+        return True, "Review added successfully"
+    
+    # Already reviewed: fetch the existing text for the message
+    c.execute('''
+        SELECT review_text FROM reviews
+        WHERE user_id = ? AND movie_id = ?
+    ''', (user_id, movie_id))
+    existing_review = c.fetchone()
+    return False, f"You have already reviewed this movie. Your review: \n\n{existing_review[0] if existing_review else ''}"
+
+@metrics.instrument('database.add_review')
 def add_review(user_id, movie_id, review_text):
     """Add a movie review"""
-    conn = create_connection()
+    conn = create_shard_connection(shard_for_movie(movie_id))
     if conn is None:
         return False, "Database connection failed"
     
     try:
-        c = conn.cursor()
-        # First check if user already has a review
-        existing_review = get_user_review(user_id, movie_id)
-        if existing_review:
-            return False, f"You have already reviewed this movie. Your review: \n\n{existing_review}"
-            
-        c.execute('''
-            INSERT INTO reviews (user_id, movie_id, review_text)
-            VALUES (?, ?, ?)
-        ''', (user_id, movie_id, review_text))
+        result = insert_review(conn, user_id, movie_id, review_text)
         conn.commit()
-        return True, "Review added successfully"
+        return result
     except Error as e:
+        metrics.record_error('database.add_review')
         return False, f"Error adding review: {str(e)}"
     finally:
         conn.close()
 
+@metrics.instrument('database.get_user_rating')
 def get_user_rating(user_id, movie_id):
     """Get a user's rating for a specific movie"""
-    conn = create_connection()
+    conn = create_shard_connection(shard_for_movie(movie_id))
     if conn is None:
         return None
     
@@ -307,14 +831,30 @@ def get_user_rating(user_id, movie_id):
         result = c.fetchone()
         return result[0] if result else None
     except Error as e:
+        metrics.record_error('database.get_user_rating')
         print(f"Error getting user rating: {e}")
         return None
     finally:
         conn.close()
 
+@metrics.instrument('database.get_user_rated_movie_ids')
+def get_user_rated_movie_ids(user_id):
+    """Get the ids of all movies a user has rated"""
+    def fetch(shard, conn):
+        c = conn.cursor()
+        c.execute('SELECT movie_id FROM ratings WHERE user_id = ?', (user_id,))
+        return [row[0] for row in c.fetchall()]
+    try:
+        return [movie_id for rows in map_shards(fetch) for movie_id in rows]
+    except Error as e:
+        metrics.record_error('database.get_user_rated_movie_ids')
+        print(f"Error getting rated movies: {e}")
+        return []
+
+@metrics.instrument('database.get_movie_ratings')
 def get_movie_ratings(movie_id):
     """Get all ratings and calculate average for a movie"""
-    conn = create_connection()
+    conn = create_shard_connection(shard_for_movie(movie_id))
     if conn is None:
         return None, 0
     
@@ -327,43 +867,237 @@ def get_movie_ratings(movie_id):
         result = c.fetchone()
         return result[0], result[1] if result else (None, 0)
     except Error as e:
+        metrics.record_error('database.get_movie_ratings')
         print(f"Error getting movie ratings: {e}")
         return None, 0
     finally:
         conn.close()
 
+@metrics.instrument('database.get_movie_reviews')
 def get_movie_reviews(movie_id):
     """Get all reviews for a movie"""
-    conn = create_connection()
+    conn = create_shard_connection(shard_for_movie(movie_id))
     if conn is None:
         return []
     
     try:
         c = conn.cursor()
         c.execute('''
-            SELECT r.review_id, r.user_id, u.username, r.review_text, r.timestamp
+            SELECT r.review_id, r.user_id, u.username, r.review_text, r.timestamp, s.label
             FROM reviews r
             JOIN users u ON r.user_id = u.user_id
+            LEFT JOIN review_sentiment s ON s.review_id = r.review_id
             WHERE r.movie_id = ?
             ORDER BY r.timestamp DESC
         ''', (movie_id,))
         return c.fetchall()
     except Error as e:
+        metrics.record_error('database.get_movie_reviews')
         print(f"Error getting movie reviews: {e}")
         return []
     finally:
         conn.close()
 
+@metrics.instrument('database.get_checkpoint')
+def get_checkpoint(conn, job_name):
+    """Get the last processed id for a batch job (0 if the job never ran)"""
+    c = conn.cursor()
+    c.execute('SELECT last_id FROM job_checkpoints WHERE job_name = ?', (job_name,))
+    result = c.fetchone()
+    return result[0] if result else 0
+
+@metrics.instrument('database.set_checkpoint')
+def set_checkpoint(conn, job_name, last_id):
+    """Record the last processed id for a batch job (caller commits)"""
+    conn.execute('''
+        INSERT OR REPLACE INTO job_checkpoints (job_name, last_id, updated_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+    ''', (job_name, last_id))
+
+@metrics.instrument('database.count_unscored_reviews')
+def count_unscored_reviews(conn, after_id=0):
+    """Count reviews without a persisted sentiment"""
+    c = conn.cursor()
+    c.execute('''
+        SELECT COUNT(*) FROM reviews r
+        LEFT JOIN review_sentiment s ON s.review_id = r.review_id
+        WHERE r.review_id > ? AND s.review_id IS NULL
+    ''', (after_id,))
+    return c.fetchone()[0]
+
+@metrics.instrument('database.get_unscored_reviews')
+def get_unscored_reviews(conn, after_id, limit):
+    """Fetch the next chunk of (review_id, review_text) without a persisted sentiment, in id order"""
+    c = conn.cursor()
+    c.execute('''
+        SELECT r.review_id, r.review_text FROM reviews r
+        LEFT JOIN review_sentiment s ON s.review_id = r.review_id
+        WHERE r.review_id > ? AND s.review_id IS NULL
+        ORDER BY r.review_id
+        LIMIT ?
+    ''', (after_id, limit))
+    return c.fetchall()
+
+@metrics.instrument('database.save_review_sentiments')
+def save_review_sentiments(conn, rows):
+    """Persist (review_id, label, score) rows in the current transaction (caller commits)"""
+    # Upsert rather than REPLACE so the update trigger keeps movie_sentiment_stats in step
+    conn.executemany('''
+        INSERT INTO review_sentiment (review_id, label, score)
+        VALUES (?, ?, ?)
+        ON CONFLICT(review_id) DO UPDATE SET
+            label = excluded.label,
+            score = excluded.score,
+            scored_at = CURRENT_TIMESTAMP
+    ''', rows)
+
+@metrics.instrument('database.set_review_sentiment')
+def set_review_sentiment(review_id, label, score):
+    """Persist the sentiment of a single review"""
+    conn = create_shard_connection(shard_for_review(review_id))
+    if conn is None:
+        return False
+    
+    try:
+        save_review_sentiments(conn, [(review_id, label, score)])
+        conn.commit()
+        return True
+    except Error as e:
+        metrics.record_error('database.set_review_sentiment')
+        print(f"Error saving review sentiment: {e}")
+        return False
+    finally:
+        conn.close()
+
+@metrics.instrument('database.rebuild_movie_sentiment_stats')
+def rebuild_movie_sentiment_stats(conn):
+    """Recompute all per-movie sentiment aggregates from review_sentiment (caller commits)"""
+    conn.execute('DELETE FROM movie_sentiment_stats')
+    conn.execute('''
+        INSERT INTO movie_sentiment_stats (
+            movie_id, positive_count, neutral_count, negative_count, score_sum, score_count
+        )
+        SELECT r.movie_id,
+               SUM(s.label = 'POSITIVE'), SUM(s.label = 'NEUTRAL'), SUM(s.label = 'NEGATIVE'),
+               COALESCE(SUM(s.score), 0), COUNT(s.score)
+        FROM review_sentiment s
+        JOIN reviews r ON r.review_id = s.review_id
+        GROUP BY r.movie_id
+    ''')
+
+def rebuild_rating_weekly(conn):
+    """Recompute the weekly rating rollups from the change log (caller commits)
+
+    Ratings made before the change log existed count as given in the week of
+    their timestamp, or of their first logged change if that was an update.
+    """
+    conn.execute('DELETE FROM rating_weekly')
+    conn.execute('''
+        WITH first_change AS (
+            SELECT user_id, movie_id, MIN(change_id) AS change_id
+            FROM rating_changes GROUP BY user_id, movie_id
+        ), events (movie_id, changed_at, old_score, new_score) AS (
+            SELECT movie_id, changed_at, old_score, new_score FROM rating_changes
+            UNION ALL
+            SELECT r.movie_id, COALESCE(r.timestamp, CURRENT_TIMESTAMP), NULL, r.score
+            FROM ratings r
+            LEFT JOIN first_change f ON f.user_id = r.user_id AND f.movie_id = r.movie_id
+            WHERE f.change_id IS NULL
+            UNION ALL
+            SELECT c.movie_id, c.changed_at, NULL, c.old_score
+            FROM first_change f JOIN rating_changes c ON c.change_id = f.change_id
+            WHERE c.old_score IS NOT NULL
+        )
+        INSERT INTO rating_weekly (
+            movie_id, week, events, given_count, given_sum, count_delta, sum_delta
+        )
+        SELECT movie_id, date(changed_at, '-6 days', 'weekday 1') AS week, COUNT(*),
+               COUNT(new_score), COALESCE(SUM(new_score), 0),
+               SUM((new_score IS NOT NULL) - (old_score IS NOT NULL)),
+               SUM(COALESCE(new_score, 0) - COALESCE(old_score, 0))
+        FROM events
+        GROUP BY movie_id, week
+    ''')
+
+@metrics.instrument('database.get_movie_rating_trend')
+def get_movie_rating_trend(movie_id, weeks=None):
+    """Get a movie's weekly rating trend from the rollups, oldest week first
+
+    Rows are (week start, ratings given that week, their average, ratings
+    held at the end of the week, average rating at the end of the week).
+    Weeks without rating activity are left out. weeks limits the result to
+    the most recent ones.
+    """
+    conn = create_shard_connection(shard_for_movie(movie_id))
+    if conn is None:
+        return []
+    
+    try:
+        c = conn.cursor()
+        c.execute('''
+            SELECT week, given_count,
+                   CASE WHEN given_count > 0 THEN 1.0 * given_sum / given_count END,
+                   total_count,
+                   CASE WHEN total_count > 0 THEN 1.0 * total_sum / total_count END
+            FROM (
+                SELECT week, given_count, given_sum,
+                       SUM(count_delta) OVER (ORDER BY week) AS total_count,
+                       SUM(sum_delta) OVER (ORDER BY week) AS total_sum
+                FROM rating_weekly WHERE movie_id = ?
+            )
+            ORDER BY week DESC LIMIT ?
+        ''', (movie_id, -1 if weeks is None else max(weeks, 0)))
+        return c.fetchall()[::-1]
+    except Error as e:
+        metrics.record_error('database.get_movie_rating_trend')
+        print(f"Error getting rating trend: {e}")
+        return []
+    finally:
+        conn.close()
+
+@metrics.instrument('database.get_movie_sentiment_summary')
+def get_movie_sentiment_summary(movie_id):
+    """Get (positive, neutral, negative, mean_score) review sentiment for a movie"""
+    conn = create_shard_connection(shard_for_movie(movie_id))
+    if conn is None:
+        return None
+    
+    try:
+        c = conn.cursor()
+        c.execute('''
+            SELECT positive_count, neutral_count, negative_count,
+                   CASE WHEN score_count > 0 THEN score_sum / score_count END
+            FROM movie_sentiment_stats WHERE movie_id = ?
+        ''', (movie_id,))
+        return c.fetchone()
+    except Error as e:
+        metrics.record_error('database.get_movie_sentiment_summary')
+        print(f"Error getting movie sentiment summary: {e}")
+        return None
+    finally:
+        conn.close()
+
 if __name__ == '__main__':
     # Initialize database and tables
     conn = create_connection()
     if conn is not None:
         create_tables(conn)
+        if '--split-shards' in sys.argv and split_into_shards():
+            # Derived data was built from the main database's copies
+            import leaderboard
+            leaderboard.rebuild_leaderboard(conn)
+            import catalog_snapshot
+            catalog_snapshot.export_snapshot(conn)
         # Check if movies table is empty before loading data
         c = conn.cursor()
         c.execute('SELECT COUNT(*) FROM movies')
         if c.fetchone()[0] == 0:
             load_movies_from_csv(conn, 'IMDB top 1000.csv')
+            # Regenerate the "More like this" index and catalog snapshot for the new catalog
+            import similar_movies
+            similar_movies.build_index(conn)
+            import catalog_snapshot
+            catalog_snapshot.export_snapshot(conn)
         conn.close()
     else:
         print("Error! Cannot create the database connection.")
\ No newline at end of file
@@ -0,0 +1,261 @@
+# export_data.py
+"""Stream movies, ratings and reviews (with persisted sentiment) to files for analytics.
+
+Rows are read with a single forward cursor per table (per shard when storage
+is sharded) and fetched CHUNK_SIZE at a time, so memory stays bounded by one
+chunk regardless of table size. Output is compressed JSON Lines (gzip, from
+the standard library) or Parquet (needs pyarrow; one row group per chunk).
+Each file is written under a temporary name and renamed when complete.
+
+Incremental runs (--incremental) export only ratings and reviews changed
+since the previous incremental run. Progress is checkpointed per shard on
+keys that only grow in commit order, read just before each table's export
+query: the rating_changes change_id for ratings, review_id for new reviews.
+A row committed after that read is simply picked up by the next run,
+however long its transaction took. Sentiment is re-exported when scored_at
+is within MARGIN_SECONDS before the previous run's read, which covers slow
+scoring transactions but also repeats some reviews, so consumers should
+dedupe on the id columns. The first incremental run exports everything, and
+movies are always exported in full. --since exports rows stamped at or after
+an explicit UTC time instead.
+
+Usage:
+    python export_data.py [--tables movies ratings reviews] [--format jsonl|parquet]
+                          [--output-dir exports] [--incremental | --since "YYYY-MM-DD HH:MM:SS"]
+                          [--compression gzip|zstd|snappy|none] [--chunk-size N]
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+
+import database
+
+CHUNK_SIZE = 50000
+JOB_PREFIX = 'export'
+MARGIN_SECONDS = int(os.environ.get("MTIP_EXPORT_MARGIN", "300"))  # Longer than any scoring transaction
+
+# name -> (columns as (name, type), query, filter for --since, stored per shard)
+TABLES = {
+    'movies': (
+        [('movie_id', 'int'), ('series_title', 'str'), ('released_year', 'int'), ('certificate', 'str'),
+         ('runtime', 'str'), ('genre', 'str'), ('imdb_rating', 'float'), ('overview', 'str'),
+         ('director', 'str'), ('stars', 'str'), ('no_of_votes', 'int'), ('gross', 'str')],
+        '''
+            SELECT movie_id, series_title, released_year, certificate, runtime, genre,
+                   imdb_rating, overview, director, stars, no_of_votes, gross
+            FROM movies {where} ORDER BY movie_id
+        ''',
+        None,
+        False,
+    ),
+    'ratings': (
+        [('rating_id', 'int'), ('user_id', 'int'), ('movie_id', 'int'), ('score', 'int'), ('timestamp', 'str')],
+        'SELECT rating_id, user_id, movie_id, score, timestamp FROM ratings {where}',
+        "timestamp >= datetime(:since, 'unixepoch')",
+        True,
+    ),
+    'reviews': (
+        [('review_id', 'int'), ('user_id', 'int'), ('movie_id', 'int'), ('review_text', 'str'),
+         ('timestamp', 'str'), ('sentiment_label', 'str'), ('sentiment_score', 'float'), ('scored_at', 'str')],
+        '''
+            SELECT r.review_id, r.user_id, r.movie_id, r.review_text, r.timestamp,
+                   s.label, s.score, s.scored_at
+            FROM reviews r
+            LEFT JOIN review_sentiment s ON s.review_id = r.review_id
+            {where}
+        ''',
+        "r.timestamp >= datetime(:since, 'unixepoch') OR s.scored_at >= datetime(:since, 'unixepoch')",
+        True,
+    ),
+}
+
+# Incremental checkpoints: table -> {key: (query for the key's current value, filter for rows after :key)}
+INCREMENTAL = {
+    'ratings': {
+        'change_id': (
+            database.LAST_CHANGE_ID,
+            '(user_id, movie_id) IN (SELECT user_id, movie_id FROM rating_changes WHERE change_id > :change_id)',
+        ),
+    },
+    'reviews': {
+        'review_id': ('SELECT COALESCE(MAX(review_id), 0) FROM reviews', 'r.review_id > :review_id'),
+        'scored_at': (
+            f"SELECT CAST(strftime('%s', 'now') AS INTEGER) - {MARGIN_SECONDS}",
+            "s.scored_at >= datetime(:scored_at, 'unixepoch')",
+        ),
+    },
+}
+
+
+def read_chunks(conn, sql, params, chunk_size):
+    """Yield lists of up to chunk_size rows from one forward cursor"""
+    c = conn.cursor()
+    c.execute(sql, params)
+    while True:
+        rows = c.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield rows
+
+
+def checkpoint_name(table, key, shard):
+    return database.shard_job_name(f"{JOB_PREFIX}:{table}:{key}", shard)
+
+
+def table_chunks(table, since, chunk_size, incremental=False, positions=None):
+    """Yield row chunks of a table from the main database or from every shard in turn
+
+    With incremental, only rows after the saved checkpoints are read, and the
+    checkpoint values to save once the export succeeds are put in positions.
+    """
+    columns, query, time_filter, sharded = TABLES[table]
+    keys = INCREMENTAL.get(table, {}) if incremental else {}
+
+    for shard in database.shard_ids() if sharded else [None]:
+        conn = database.create_shard_connection(shard)
+        if conn is None:
+            raise database.Error("Cannot create the database connection")
+        try:
+            where, params = '', {}
+            if since is not None and time_filter is not None:
+                where, params = f'WHERE {time_filter}', {'since': since}
+            elif keys:
+                # job_checkpoints lives in the main database, which shard connections attach
+                c = conn.cursor()
+                for key, (position_query, _) in keys.items():
+                    job_name = checkpoint_name(table, key, shard)
+                    c.execute('SELECT last_id FROM job_checkpoints WHERE job_name = ?', (job_name,))
+                    saved = c.fetchone()
+                    params[key] = saved[0] if saved else None
+                    positions[job_name] = c.execute(position_query).fetchone()[0]
+                # Until an incremental run has finished, export everything
+                if None not in params.values():
+                    where = 'WHERE ' + ' OR '.join(f'({key_filter})' for _, key_filter in keys.values())
+            yield from read_chunks(conn, query.format(where=where), params, chunk_size)
+        finally:
+            conn.close()
+
+
+class JsonlWriter:
+    """Rows as one JSON object per line, optionally gzip-compressed"""
+    def __init__(self, path, columns, compression):
+        self.names = [name for name, _ in columns]
+        if compression == 'gzip':
+            self.file = gzip.open(path, 'wt', encoding='utf-8')
+        else:
+            self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, rows):
+        self.file.writelines(json.dumps(dict(zip(self.names, row)), ensure_ascii=False) + '\n' for row in rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """Rows as Parquet, one row group per chunk"""
+    def __init__(self, path, columns, compression):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        types = {'int': pa.int64(), 'float': pa.float64(), 'str': pa.string()}
+        self.pa = pa
+        self.schema = pa.schema([(name, types[kind]) for name, kind in columns])
+        self.writer = pq.ParquetWriter(path, self.schema, compression=compression)
+
+    def write(self, rows):
+        arrays = [self.pa.array(values, type=field.type) for values, field in zip(zip(*rows), self.schema)]
+        self.writer.write_batch(self.pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def export_table(table, output_dir, file_format, compression, since, chunk_size, stamp,
+                 incremental=False, positions=None):
+    """Stream one table to a file; returns (path, row count)"""
+    columns = TABLES[table][0]
+    if file_format == 'parquet':
+        path = os.path.join(output_dir, f"{table}-{stamp}.parquet")
+        writer_class = ParquetWriter
+    else:
+        suffix = '.gz' if compression == 'gzip' else ''
+        path = os.path.join(output_dir, f"{table}-{stamp}.jsonl{suffix}")
+        writer_class = JsonlWriter
+
+    tmp_path = f"{path}.tmp"
+    writer = writer_class(tmp_path, columns, compression)
+    count = 0
+    try:
+        for rows in table_chunks(table, since, chunk_size, incremental, positions):
+            writer.write(rows)
+            count += len(rows)
+    except BaseException:
+        writer.close()
+        os.remove(tmp_path)
+        raise
+    writer.close()
+    os.replace(tmp_path, path)
+    return path, count
+
+
+def run_export(tables, output_dir, file_format, compression, incremental=False, since=None, chunk_size=CHUNK_SIZE):
+    """Export tables; with incremental, only rows changed since the last incremental run"""
+    conn = database.create_connection()
+    if conn is None:
+        print("Error! Cannot create the database connection.")
+        return False
+
+    try:
+        database.create_tables(conn)
+        os.makedirs(output_dir, exist_ok=True)
+        # File name stamp from SQLite's clock, which also stamps the rows
+        export_start = conn.execute("SELECT CAST(strftime('%s', 'now') AS INTEGER)").fetchone()[0]
+        if since is not None:
+            since = conn.execute("SELECT CAST(strftime('%s', ?) AS INTEGER)", (since,)).fetchone()[0]
+            if since is None:
+                print("Error: --since must look like 'YYYY-MM-DD HH:MM:SS'")
+                return False
+        stamp = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(export_start))
+
+        for table in tables:
+            positions = {}
+            start = time.monotonic()
+            path, count = export_table(table, output_dir, file_format, compression, since, chunk_size, stamp,
+                                       incremental, positions)
+            print(f"Exported {count} {table} rows to {path} in {time.monotonic() - start:.1f}s")
+            for job_name, position in positions.items():
+                database.set_checkpoint(conn, job_name, position)
+            conn.commit()
+        return True
+    except ImportError:
+        print("Error: Parquet export needs pyarrow (pip install pyarrow)")
+        return False
+    except (database.Error, OSError) as e:
+        print(f"Error exporting data: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export movies, ratings and reviews for analytics")
+    parser.add_argument('--tables', nargs='+', choices=list(TABLES), default=list(TABLES))
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], default='jsonl')
+    parser.add_argument('--output-dir', default='exports')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--incremental', action='store_true',
+                       help="only rows changed since the last incremental export")
+    group.add_argument('--since', help="only rows changed at or after this UTC time")
+    parser.add_argument('--compression', choices=['gzip', 'zstd', 'snappy', 'none'],
+                        help="jsonl: gzip (default) or none; parquet: zstd (default), snappy, gzip or none")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="rows fetched and written per chunk")
+    args = parser.parse_args()
+
+    compression = args.compression or ('zstd' if args.format == 'parquet' else 'gzip')
+    if args.format == 'jsonl' and compression not in ('gzip', 'none'):
+        parser.error("jsonl output supports --compression gzip or none")
+    ok = run_export(args.tables, args.output_dir, args.format, compression,
+                    args.incremental, args.since, args.chunk_size)
+    raise SystemExit(0 if ok else 1)
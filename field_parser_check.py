@@ -0,0 +1,151 @@
+# field_parser_check.py
+"""Check movie_fields against the original CSV field parsing, then benchmark both.
+
+The reference below is the parsing load_movies_from_csv used before
+movie_fields existed, kept verbatim. Equivalence is checked on every row of
+the bundled CSV and on randomly generated Title/Cast/Info values built from
+the tokens the parsers react to (rank prefixes, years, separators, Unicode
+digits and whitespace). For inputs the reference rejects, movie_fields must
+raise as well. Any difference is printed with a reproducible seed and the
+script exits with status 1.
+
+Usage:
+    python field_parser_check.py [--cases N] [--seed N] [--csv FILE] [--repeat N]
+"""
+import argparse
+import csv
+import random
+import re
+import sys
+import timeit
+
+import movie_fields
+
+CSV_FILE = 'IMDB top 1000.csv'
+
+
+# Reference implementation (database.py before movie_fields)
+
+def parse_year(title):
+    match = re.search(r'\((\d{4})\)', title)
+    return int(match.group(1)) if match else None
+
+def parse_title(title):
+    title = re.sub(r'^\d+\.\s*', '', title)
+    title = re.sub(r'\(\d{4}\)', '', title)
+    return title.strip()
+
+def extract_director_and_stars(cast_text):
+    director = ""
+    stars = ""
+    if cast_text and isinstance(cast_text, str):
+        parts = cast_text.split(" | Stars: ")
+        if len(parts) > 0:
+            director = parts[0].replace("Director: ", "").strip()
+            if len(parts) > 1:
+                stars = parts[1].strip()
+    return director, stars
+
+def parse_votes_and_gross(info):
+    votes = 0
+    gross = ""
+    if "Votes:" in info:
+        votes_match = re.search(r'Votes: ([\d,]+)', info)
+        if votes_match:
+            votes = int(votes_match.group(1).replace(',', ''))
+    if "Gross:" in info:
+        gross_match = re.search(r'Gross: \$([\d.]+)M', info)
+        if gross_match:
+            gross = gross_match.group(1) + "M"
+    return votes, gross
+
+def reference_fields(title, cast, info):
+    clean_title = parse_title(title.split('.', 1)[1].strip())
+    year = parse_year(title)
+    director, stars = extract_director_and_stars(cast)
+    votes, gross = parse_votes_and_gross(info)
+    return clean_title, year, director, stars, votes, gross
+
+
+# Random inputs
+
+TITLE_TOKENS = ['1', '42', '2001', '.', '. ', ' ', '  ', '\t', ' ', ' ', '(', ')', '(1994)', '(2019)',
+                '(19', '94)', '١٩٩٤', 'The', 'Matrix', ':', '8½', 'é', '\n', '1.', '12. ']
+CAST_TOKENS = ['Director: ', 'Directors: ', ' | Stars: ', ' | ', 'Stars: ', 'Frank Darabont', ', ', ' ', '\t',
+               'Tim Robbins', 'Director:', '|', '']
+INFO_TOKENS = ['Votes: ', 'Votes:', 'Gross: $', 'Gross: ', '$', 'M', ' | ', '1', '2,295,987', ',', '.', '28.34',
+               '١٢', ' ', 'Votes: 1,000', 'Gross: $1.5M', 'k']
+
+
+def random_text(rng, tokens, max_tokens=12):
+    return ''.join(rng.choice(tokens) for _ in range(rng.randint(0, max_tokens)))
+
+
+def random_case(rng):
+    """Mostly CSV-shaped values with random pieces, sometimes pure token soup"""
+    if rng.random() < 0.5:
+        title = f"{rng.randint(1, 1000)}.{random_text(rng, [' ', '', '  '], 2)}" \
+                f"{random_text(rng, TITLE_TOKENS, 6)} ({rng.randint(1900, 2030)}){random_text(rng, TITLE_TOKENS, 2)}"
+        cast = f"Director: {random_text(rng, CAST_TOKENS, 4)} | Stars: {random_text(rng, CAST_TOKENS, 6)}"
+        info = f"Votes: {rng.randint(0, 3_000_000):,} | Gross: ${rng.randint(0, 99999) / 100}M"
+        if rng.random() < 0.3:
+            info = random_text(rng, INFO_TOKENS)
+    else:
+        title = random_text(rng, TITLE_TOKENS, 16)
+        cast = rng.choice([random_text(rng, CAST_TOKENS), float('nan'), None])
+        info = random_text(rng, INFO_TOKENS, 16)
+    return title, cast, info
+
+
+def outcome(func, *args):
+    try:
+        return func(*args)
+    except Exception as e:
+        return f"raised {type(e).__name__}"
+
+
+def compare(case):
+    """None if both parsers agree on case, otherwise a description of the difference"""
+    expected = outcome(reference_fields, *case)
+    actual = outcome(movie_fields.parse_movie_fields, *case)
+    raised = isinstance(expected, str), isinstance(actual, str)
+    if raised == (True, True) or expected == actual:
+        return None
+    return f"input {case!r}\n  reference:    {expected!r}\n  movie_fields: {actual!r}"
+
+
+def read_csv_rows(csv_file):
+    with open(csv_file, newline='', encoding='utf-8') as f:
+        return [(row['Title'], row['Cast'], row['Info']) for row in csv.DictReader(f)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark movie_fields against the original parsing")
+    parser.add_argument('--cases', type=int, default=100000, help="random cases to check")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--csv', default=CSV_FILE)
+    parser.add_argument('--repeat', type=int, default=5, help="benchmark passes over the CSV rows; best one counts")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    rows = read_csv_rows(args.csv)
+    failures = [diff for diff in map(compare, rows) if diff]
+    rng = random.Random(seed)
+    for _ in range(args.cases):
+        diff = compare(random_case(rng))
+        if diff:
+            failures.append(diff)
+    print(f"Checked {len(rows)} CSV rows and {args.cases} random cases (seed {seed}): {len(failures)} differences")
+    for diff in failures[:10]:
+        print(diff)
+    if failures:
+        return 1
+
+    for name, func in (('reference', reference_fields), ('movie_fields', movie_fields.parse_movie_fields)):
+        seconds = min(timeit.repeat(lambda: [func(*row) for row in rows], number=1, repeat=args.repeat))
+        print(f"{name:>12}: {seconds / len(rows) * 1e6:.2f} us/row ({seconds * 1000:.1f} ms per {len(rows)} rows)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
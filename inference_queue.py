@@ -0,0 +1,139 @@
+# inference_queue.py
+"""Dynamic micro-batching in front of sentiment.predict_sentiments.
+
+Callers submit single texts and get a future back. A worker thread takes the
+first waiting request, keeps collecting until it has max_batch_size texts or
+max_wait_ms has passed since that first request, then runs one batched
+forward pass and resolves every future in the batch. Under load batches fill
+up immediately; a lone request waits at most max_wait_ms. The queue is
+bounded: once max_queue_depth requests are waiting, submit() raises
+QueueFullError so callers can shed load instead of queueing without limit.
+submit_many() reserves room for all of a request's texts before queueing
+any, so a request that does not fit is rejected whole and nothing of it is
+scored for a caller that already gave up.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import sentiment
+
+MAX_BATCH_SIZE = int(os.environ.get("MTIP_BATCH_SIZE", "32"))
+MAX_WAIT_MS = float(os.environ.get("MTIP_BATCH_WAIT_MS", "5"))
+MAX_QUEUE_DEPTH = int(os.environ.get("MTIP_QUEUE_DEPTH", "1024"))
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue is at its maximum depth"""
+
+
+class MicroBatcher:
+    """Collects single-text requests into batched sentiment calls"""
+    def __init__(self, predict=None, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS,
+                 max_queue_depth=MAX_QUEUE_DEPTH):
+        self.predict = predict or sentiment.predict_sentiments
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_depth = max_queue_depth
+        self.requests = queue.Queue()
+        self.depth = 0  # Texts queued and not yet taken into a batch
+        self.depth_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.stopping = False
+        self.worker = threading.Thread(target=self.run, name='sentiment-batcher', daemon=True)
+        self.worker.start()
+
+    def submit(self, text):
+        """Queue a text for scoring; returns a Future of (label, mean_score)"""
+        return self.submit_many([text])[0]
+
+    def submit_many(self, texts):
+        """Queue texts for scoring, all or none; returns their Futures"""
+        if self.stopping:
+            raise RuntimeError("Inference queue is shut down")
+        with self.depth_lock:
+            if self.max_queue_depth > 0 and self.depth + len(texts) > self.max_queue_depth:
+                raise QueueFullError("Inference queue is full")
+            self.depth += len(texts)
+        futures = [Future() for _ in texts]
+        for text, future in zip(texts, futures):
+            self.requests.put_nowait((text, future))
+        return futures
+
+    def score(self, text, timeout=None):
+        """Score one text, blocking until its batch completes"""
+        return self.submit(text).result(timeout)
+
+    def collect_batch(self):
+        """Block for the first request, then gather more until the batch is full or the wait expires"""
+        first = self.requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Shutdown sentinel: finish this batch, then stop
+                self.requests.put_nowait(None)
+                break
+            batch.append(item)
+        with self.depth_lock:
+            self.depth -= len(batch)
+        return batch
+
+    def run(self):
+        """Worker loop: one forward pass per collected batch"""
+        while True:
+            batch = self.collect_batch()
+            if batch is None:
+                return
+            # Skip requests whose callers already gave up
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.predict([text for text, _ in batch], batch_size=len(batch))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        """Queue depth, batch count and mean batch size"""
+        return {
+            'queue_depth': self.depth,
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+        }
+
+    def shutdown(self, timeout=None):
+        """Stop accepting requests and let queued ones finish"""
+        self.stopping = True
+        self.requests.put(None)
+        self.worker.join(timeout)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    """Return the shared batcher, starting it on first use"""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = MicroBatcher()
+        return _batcher
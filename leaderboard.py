@@ -0,0 +1,243 @@
+# leaderboard.py
+"""Precomputed movie leaderboard with Bayesian smoothing.
+
+Each movie's score is a two-level Bayesian average on the 1-10 scale:
+
+    prior = (votes * imdb_rating + IMDB_PRIOR_VOTES * catalog_mean) / (votes + IMDB_PRIOR_VOTES)
+    score = (APP_PRIOR_WEIGHT * prior + sum(app ratings)) / (APP_PRIOR_WEIGHT + count(app ratings))
+
+so a handful of in-app ratings nudges a well-known movie only slightly, and
+obscure movies are pulled towards the catalog mean. Scores live in the
+leaderboard tables with (decade, score) and (genre, decade, score) indexes,
+so a read is an index range scan of `limit` rows. Rating changes reach the
+leaderboard through the rating_changes log that triggers on ratings append
+to; refresh_leaderboard() applies only the entries since its checkpoint.
+With sharded storage each shard has its own log and checkpoint, and the
+shards are read in parallel.
+
+Usage:
+    python leaderboard.py [--rebuild]
+"""
+import argparse
+
+import database
+
+JOB_NAME = 'leaderboard'
+IMDB_PRIOR_VOTES = 25000  # IMDB votes worth as much as the catalog mean
+APP_PRIOR_WEIGHT = 10  # In-app ratings worth as much as a movie's IMDB prior
+
+
+def movie_prior(imdb_rating, votes, catalog_mean):
+    """IMDB rating shrunk towards the catalog mean by its vote count"""
+    if imdb_rating is None:
+        return catalog_mean
+    votes = votes or 0
+    return (votes * imdb_rating + IMDB_PRIOR_VOTES * catalog_mean) / (votes + IMDB_PRIOR_VOTES)
+
+
+def smoothed_score(prior, app_count, app_sum):
+    """Bayesian average of the prior and the in-app ratings"""
+    return (APP_PRIOR_WEIGHT * prior + app_sum) / (APP_PRIOR_WEIGHT + app_count)
+
+
+def split_genres(genre):
+    """Individual genres from a comma-separated genre field"""
+    return [g.strip() for g in (genre or '').split(',') if g.strip()]
+
+
+def read_rating_totals(shard, conn):
+    """(last change_id, [(movie_id, count, sum)]) from one consistent read of a shard"""
+    c = conn.cursor()
+    c.execute('BEGIN')
+    try:
+        c.execute(database.LAST_CHANGE_ID)
+        last_change = c.fetchone()[0]
+        c.execute('SELECT movie_id, COUNT(*), SUM(score) FROM ratings GROUP BY movie_id')
+        return last_change, c.fetchall()
+    finally:
+        conn.rollback()
+
+
+def read_rating_deltas(shard, conn):
+    """Per-movie (movie_id, count delta, sum delta, last change_id) logged since the shard's checkpoint"""
+    c = conn.cursor()
+    # job_checkpoints lives in the main database, which shard connections attach
+    last_change = database.get_checkpoint(conn, database.shard_job_name(JOB_NAME, shard))
+    c.execute('''
+        SELECT movie_id,
+               SUM((new_score IS NOT NULL) - (old_score IS NOT NULL)),
+               SUM(COALESCE(new_score, 0) - COALESCE(old_score, 0)),
+               MAX(change_id)
+        FROM rating_changes
+        WHERE change_id > ?
+        GROUP BY movie_id
+    ''', (last_change,))
+    return c.fetchall()
+
+
+def rebuild_leaderboard(conn):
+    """Recompute the whole leaderboard from movies and ratings"""
+    try:
+        c = conn.cursor()
+        shard_totals = database.map_shards(read_rating_totals)
+        totals = {movie_id: (count, total)
+                  for _, rows in shard_totals for movie_id, count, total in rows}
+        c.execute('SELECT AVG(imdb_rating) FROM movies WHERE imdb_rating IS NOT NULL')
+        catalog_mean = c.fetchone()[0] or 0
+
+        c.execute('SELECT movie_id, released_year, genre, imdb_rating, no_of_votes FROM movies')
+        rows, genre_rows = [], []
+        for movie_id, year, genre, imdb_rating, votes in c.fetchall():
+            app_count, app_sum = totals.get(movie_id, (0, 0))
+            decade = year // 10 * 10 if year else None
+            prior = movie_prior(imdb_rating, votes, catalog_mean)
+            score = smoothed_score(prior, app_count, app_sum)
+            rows.append((movie_id, decade, prior, app_count, app_sum, score))
+            genre_rows.extend((g, movie_id, decade, score) for g in split_genres(genre))
+
+        c.execute('DELETE FROM leaderboard')
+        c.execute('DELETE FROM leaderboard_genres')
+        c.executemany('''
+            INSERT INTO leaderboard (movie_id, decade, prior, app_count, app_sum, score)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+        c.executemany('''
+            INSERT OR IGNORE INTO leaderboard_genres (genre, movie_id, decade, score)
+            VALUES (?, ?, ?, ?)
+        ''', genre_rows)
+        for shard, (last_change, _) in zip(database.shard_ids(), shard_totals):
+            database.set_checkpoint(conn, database.shard_job_name(JOB_NAME, shard), last_change)
+        conn.commit()
+        print(f"Rebuilt leaderboard for {len(rows)} movies")
+        return True
+    except database.Error as e:
+        conn.rollback()
+        print(f"Error rebuilding leaderboard: {e}")
+        return False
+
+
+def refresh_leaderboard(conn):
+    """Apply rating changes logged since the last refresh"""
+    try:
+        c = conn.cursor()
+        shard_deltas = database.map_shards(read_rating_deltas)
+        deltas = [delta for rows in shard_deltas for delta in rows]
+        if not deltas:
+            return True
+
+        for movie_id, count_delta, sum_delta, change_id in deltas:
+            c.execute('''
+                UPDATE leaderboard SET
+                    app_count = app_count + ?,
+                    app_sum = app_sum + ?
+                WHERE movie_id = ?
+            ''', (count_delta, sum_delta, movie_id))
+            if c.rowcount == 0:
+                # A movie added after the last rebuild has no prior yet
+                conn.rollback()
+                return rebuild_leaderboard(conn)
+            c.execute('''
+                UPDATE leaderboard SET score = (? * prior + app_sum) / (? + app_count)
+                WHERE movie_id = ?
+            ''', (APP_PRIOR_WEIGHT, APP_PRIOR_WEIGHT, movie_id))
+            c.execute('''
+                UPDATE leaderboard_genres
+                SET score = (SELECT score FROM leaderboard WHERE movie_id = ?)
+                WHERE movie_id = ?
+            ''', (movie_id, movie_id))
+
+        for shard, rows in zip(database.shard_ids(), shard_deltas):
+            if rows:
+                database.set_checkpoint(conn, database.shard_job_name(JOB_NAME, shard), max(d[3] for d in rows))
+        conn.commit()
+        return True
+    except database.Error as e:
+        conn.rollback()
+        print(f"Error refreshing leaderboard: {e}")
+        return False
+
+
+def get_leaderboard(genre=None, decade=None, limit=20):
+    """Top movies as (movie_id, title, year, score, app_count) rows, optionally by genre and decade"""
+    conn = database.create_connection()
+    if conn is None:
+        return []
+
+    try:
+        c = conn.cursor()
+        conditions, params = [], []
+        if genre:
+            table = 'leaderboard_genres g JOIN leaderboard l ON l.movie_id = g.movie_id'
+            conditions.append('g.genre = ?')
+            params.append(genre)
+            order = 'g.score'
+            decade_column = 'g.decade'
+        else:
+            table = 'leaderboard l'
+            order = 'l.score'
+            decade_column = 'l.decade'
+        if decade is not None:
+            conditions.append(f'{decade_column} = ?')
+            params.append(decade)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        c.execute(f'''
+            SELECT m.movie_id, m.series_title, m.released_year, l.score, l.app_count
+            FROM {table}
+            JOIN movies m ON m.movie_id = l.movie_id
+            {where}
+            ORDER BY {order} DESC
+            LIMIT ?
+        ''', params + [limit])
+        return c.fetchall()
+    except database.Error as e:
+        print(f"Error getting leaderboard: {e}")
+        return []
+    finally:
+        conn.close()
+
+
+def get_leaderboard_filters():
+    """Available (genres, decades) for leaderboard queries"""
+    conn = database.create_connection()
+    if conn is None:
+        return [], []
+
+    try:
+        c = conn.cursor()
+        c.execute('SELECT DISTINCT genre FROM leaderboard_genres ORDER BY genre')
+        genres = [row[0] for row in c.fetchall()]
+        c.execute('SELECT DISTINCT decade FROM leaderboard WHERE decade IS NOT NULL ORDER BY decade DESC')
+        decades = [row[0] for row in c.fetchall()]
+        return genres, decades
+    except database.Error as e:
+        print(f"Error getting leaderboard filters: {e}")
+        return [], []
+    finally:
+        conn.close()
+
+
+def update_leaderboard(conn):
+    """Refresh the leaderboard, building it first if it is empty"""
+    c = conn.cursor()
+    c.execute('SELECT 1 FROM leaderboard LIMIT 1')
+    if c.fetchone() is None:
+        return rebuild_leaderboard(conn)
+    return refresh_leaderboard(conn)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build or refresh the movie leaderboard")
+    parser.add_argument('--rebuild', action='store_true', help="recompute from scratch")
+    args = parser.parse_args()
+
+    conn = database.create_connection()
+    if conn is not None:
+        database.create_tables(conn)
+        if args.rebuild:
+            rebuild_leaderboard(conn)
+        else:
+            update_leaderboard(conn)
+        conn.close()
+    else:
+        print("Error! Cannot create the database connection.")
@@ -0,0 +1,105 @@
+# load_test.py
+"""Load test for a locally running api_server.py.
+
+Opens a number of concurrent clients that issue a mix of read requests
+(listing, search, details, reviews) and optionally sentiment requests for a
+fixed duration, then reports throughput and latency percentiles per endpoint.
+
+Usage:
+    python api_server.py &
+    python load_test.py [--url http://127.0.0.1:8080] [--concurrency 64] [--duration 30] [--sentiment]
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+
+import aiohttp
+
+SEARCH_TERMS = ['the', 'god', 'star', 'love', 'war', 'man', 'night', 'city']
+SAMPLE_REVIEWS = [
+    "An absolute masterpiece, I loved every minute of it.",
+    "Boring and far too long, I nearly fell asleep.",
+    "Decent acting but the story goes nowhere.",
+    "Harika bir film, kesinlikle tekrar izlerim.",
+]
+
+
+def percentile(values, fraction):
+    """Value at the given fraction of a sorted list"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def client(session, base_url, movie_ids, deadline, with_sentiment, latencies, errors):
+    """Issue requests until the deadline, recording latency per endpoint"""
+    while time.monotonic() < deadline:
+        choice = random.random()
+        movie_id = random.choice(movie_ids)
+        if with_sentiment and choice < 0.2:
+            name, method, url = 'sentiment', 'POST', f"{base_url}/api/sentiment"
+            kwargs = {'json': {'text': random.choice(SAMPLE_REVIEWS)}}
+        elif choice < 0.4:
+            name, method, url = 'search', 'GET', f"{base_url}/api/movies"
+            kwargs = {'params': {'q': random.choice(SEARCH_TERMS), 'limit': 50}}
+        elif choice < 0.75:
+            name, method, url = 'details', 'GET', f"{base_url}/api/movies/{movie_id}"
+            kwargs = {}
+        else:
+            name, method, url = 'reviews', 'GET', f"{base_url}/api/movies/{movie_id}/reviews"
+            kwargs = {}
+
+        start = time.perf_counter()
+        try:
+            async with session.request(method, url, **kwargs) as response:
+                await response.read()
+                if response.status >= 400:
+                    errors[name] += 1
+                    continue
+        except aiohttp.ClientError:
+            errors[name] += 1
+            continue
+        latencies[name].append(time.perf_counter() - start)
+
+
+async def run(base_url, concurrency, duration, with_sentiment):
+    """Run the load test and print a report"""
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async with session.get(f"{base_url}/api/movies", params={'limit': 500}) as response:
+            movie_ids = [m['movie_id'] for m in (await response.json())['movies']]
+        if not movie_ids:
+            print("No movies returned by the server")
+            return
+
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        start = time.monotonic()
+        deadline = start + duration
+        await asyncio.gather(*(
+            client(session, base_url, movie_ids, deadline, with_sentiment, latencies, errors)
+            for _ in range(concurrency)
+        ))
+        elapsed = time.monotonic() - start
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"{total} requests in {elapsed:.1f}s with {concurrency} clients: {total / elapsed:.1f} req/s")
+    print(f"{'endpoint':<10} {'count':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name in sorted(set(latencies) | set(errors)):
+        values = sorted(latencies[name])
+        print(f"{name:<10} {len(values):>8} {errors[name]:>7} "
+              f"{percentile(values, 0.50) * 1000:>8.1f} {percentile(values, 0.95) * 1000:>8.1f} "
+              f"{percentile(values, 0.99) * 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test a local MTIP API server")
+    parser.add_argument('--url', default='http://127.0.0.1:8080')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--sentiment', action='store_true', help="include sentiment requests")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.url.rstrip('/'), args.concurrency, args.duration, args.sentiment))
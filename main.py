@@ -1,9 +1,16 @@
+import os
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
 import database
 import auth
 import sentiment  # Add this import for
+import recommender
+import similar_movies
+import catalog_snapshot
+import leaderboard
+import ui_profiler
+import ui_render
 class ErrorHandler:
     """Centralized error handling for the application"""
     def __init__(self, root):
@@ -222,6 +229,10 @@ class MovieApp:
     def __init__(self, root):
         self.root = root
         self.error_handler = ErrorHandler(root)
+        self.profiler = None
+        if ui_profiler.is_enabled():
+            # Wrap handlers before setup binds them to widgets
+            self.profiler = ui_profiler.attach(self)
         
         try:
             # Initialize database connection
@@ -239,6 +250,7 @@ class MovieApp:
         self.root.geometry("1800x1020")
         self.current_user = None
         self.current_user_id = None
+        self.coalescer = ui_render.IdleCoalescer(self.root)
         self.create_menu()
         self.main_container = ttk.PanedWindow(root, orient=tk.HORIZONTAL)
         self.main_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
@@ -268,11 +280,19 @@ class MovieApp:
         menubar.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="Exit", command=self.root.quit)
         
+        # Browse menu
+        browse_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Browse", menu=browse_menu)
+        browse_menu.add_command(label="Leaderboard", command=self.show_leaderboard)
+        
         # Account menu
         self.account_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Account", menu=self.account_menu)
         self.account_menu.add_command(label="Login", command=self.show_login)
         self.account_menu.add_command(label="Logout", command=self.logout, state=tk.DISABLED)
+        self.account_menu.add_separator()
+        self.account_menu.add_command(label="Recommended for you", command=self.show_recommendations,
+                                      state=tk.DISABLED)
 
     def show_login(self):
         """Show the login window"""
@@ -300,9 +320,11 @@ class MovieApp:
         if self.current_user:
             self.account_menu.entryconfig("Login", state=tk.DISABLED)
             self.account_menu.entryconfig("Logout", state=tk.NORMAL)
+            self.account_menu.entryconfig("Recommended for you", state=tk.NORMAL)
         else:
             self.account_menu.entryconfig("Login", state=tk.NORMAL)
             self.account_menu.entryconfig("Logout", state=tk.DISABLED)
+            self.account_menu.entryconfig("Recommended for you", state=tk.DISABLED)
 
     def update_rating_review_state(self):
         """Update the state of rating and review widgets based on login status"""
@@ -335,7 +357,8 @@ class MovieApp:
         search_frame.pack(side=tk.RIGHT)
 
         self.search_var = tk.StringVar()
-        self.search_var.trace('w', self.on_search_change)
+        # Typing fires once per keystroke; filter once per idle point
+        self.search_var.trace('w', lambda *args: self.coalescer.schedule('search', self.on_search_change))
         
         search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=20)
         search_entry.pack(side=tk.LEFT, padx=5)
@@ -359,6 +382,7 @@ class MovieApp:
                                       selectmode='browse',
                                       xscrollcommand=x_scrollbar.set,
                                       yscrollcommand=y_scrollbar.set)
+        self.tree_pages = ui_render.PagedTreeFill(self.movie_tree)
         
         self.movie_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
@@ -378,7 +402,7 @@ class MovieApp:
         self.movie_tree.column('Rating', width=100, anchor=tk.CENTER)
 
         # Bind events
-        self.movie_tree.bind('<<TreeviewSelect>>', self.on_select_movie)
+        self.movie_tree.bind('<<TreeviewSelect>>', lambda e: self.coalescer.schedule('details', self.on_select_movie, e))
         self.movie_tree.bind('<Double-1>', self.on_movie_double_click)
 
     def setup_movie_details(self):
@@ -400,6 +424,16 @@ class MovieApp:
         details_scroll.config(command=self.details_text.yview)
         self.details_text.config(state=tk.DISABLED)
 
+        # More like this section
+        similar_frame = ttk.LabelFrame(details_frame, text="More Like This")
+        similar_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        self.similar_list = tk.Listbox(similar_frame, height=5, activestyle='none')
+        self.similar_list.pack(fill=tk.X, padx=5, pady=5)
+        self.similar_list.bind('<Double-1>', self.on_similar_double_click)
+        CustomTooltip(self.similar_list, text="Double-click to open a similar movie")
+        self.similar_movie_ids = []
+
         # Rating section with improved UI
         rating_frame = ttk.LabelFrame(details_frame, text="Rate This Movie")
         rating_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -506,17 +540,15 @@ class MovieApp:
 
     def load_movies(self):
         """Load movies into the Treeview"""
-        # Clear existing items
-        for item in self.movie_tree.get_children():
-            self.movie_tree.delete(item)
-
-        # Get movies from database
-        movies = database.get_all_movies()
+        # Page movies in from the memory-mapped snapshot, or load them from the database if it is missing or stale
+        snapshot = catalog_snapshot.get_snapshot()
+        if snapshot is not None:
+            self.tree_pages.start(len(snapshot), snapshot.list_rows)
+            return
         
-        # Insert into Treeview
-        for movie in movies:
-            movie_id, title, year, rating = movie
-            self.movie_tree.insert('', tk.END, values=(movie_id, title, year, rating))
+        # Replace the Treeview contents in one batch
+        self.tree_pages.cancel()
+        ui_render.replace_tree_rows(self.movie_tree, database.get_all_movies())
 
     def submit_rating(self):
         """Submit a rating for the current movie"""
@@ -536,6 +568,7 @@ class MovieApp:
 
             success, message = database.add_rating(self.current_user_id, movie_id, score)
             if success:
+                recommender.on_rating_added(self.current_user_id, movie_id, score)
                 self.error_handler.show_info("Success", message)
                 self.refresh_movie_details()
             else:
@@ -565,7 +598,11 @@ class MovieApp:
             if success:
                 # Predict sentiment after successful review submission
                 try:
-                    sentiment_label = sentiment.predict_sentiment(review_text)
+                    sentiment_label, sentiment_score = sentiment.score_sentiment(review_text)
+                    if sentiment_score is not None:
+                        review_id = database.get_user_review_id(self.current_user_id, movie_id)
+                        if review_id is not None:
+                            database.set_review_sentiment(review_id, sentiment_label, sentiment_score)
                     emoji = "😀" if sentiment_label == "POSITIVE" else "😐" if sentiment_label == "NEUTRAL" else "😞"
                     self.error_handler.show_info("Success", f"{message}\nSentiment: {sentiment_label} {emoji}")
                 except Exception as e:
@@ -581,7 +618,7 @@ class MovieApp:
         """Refresh the movie details display"""
         selected_items = self.movie_tree.selection()
         if selected_items:
-            self.on_select_movie(None)  # Reuse existing method to refresh details
+            self.coalescer.schedule('details', self.on_select_movie, None)  # Reuse existing method to refresh details
 
     def on_select_movie(self, event):
         """Handle movie selection"""
@@ -595,14 +632,6 @@ class MovieApp:
         # Get movie details
         movie = database.get_movie_details(movie_id)
         if movie:
-            # Enable text widget for editing
-            self.details_text.config(state=tk.NORMAL)
-            self.reviews_text.config(state=tk.NORMAL)
-            
-            # Clear current content
-            self.details_text.delete(1.0, tk.END)
-            self.reviews_text.delete(1.0, tk.END)
-            
             # Get ratings info
             avg_rating, num_ratings = database.get_movie_ratings(movie_id)
             avg_rating_str = f"{avg_rating:.1f}" if avg_rating else "No ratings yet"
@@ -627,15 +656,32 @@ Stars:
 Number of Votes: {movie[10]}
 Gross: {movie[11]}
 """
-            self.details_text.insert(tk.END, details)
             
-            # Get and display reviews with sentiment emojis
+            # Persisted per-movie sentiment distribution
+            summary = database.get_movie_sentiment_summary(movie_id)
+            if summary and sum(summary[:3]) > 0:
+                positive, neutral, negative, mean_score = summary
+                total = positive + neutral + negative
+                mean_str = f", mean {mean_score:.2f}/5" if mean_score is not None else ""
+                details += f"""
+Review Sentiment: 😀 {positive} ({positive / total:.0%})  😐 {neutral} ({neutral / total:.0%})  😞 {negative} ({negative / total:.0%}){mean_str}
+"""
+            ui_render.replace_text(self.details_text, details)
+            
+            self.show_similar_movies(movie_id)
+            
+            # Get and display reviews with sentiment emojis, built into one insert
             reviews = database.get_movie_reviews(movie_id)
+            review_parts = []
             if reviews:
                 for review in reviews:
                     try:
-                        # Predict sentiment for each review
-                        sentiment_label = sentiment.predict_sentiment(review[3])
+                        # Use the persisted sentiment, scoring and saving it on first display
+                        sentiment_label = review[5]
+                        if sentiment_label is None:
+                            sentiment_label, sentiment_score = sentiment.score_sentiment(review[3])
+                            if sentiment_score is not None:
+                                database.set_review_sentiment(review[0], sentiment_label, sentiment_score)
                         emoji = "😀" if sentiment_label == "POSITIVE" else "😐" if sentiment_label == "NEUTRAL" else "😞"
                         # Format the review with proper alignment
                         review_text = f"""
@@ -643,7 +689,7 @@ Gross: {movie[11]}
 {review[3]}
 ----------------------------------------
 """
-                        self.reviews_text.insert(tk.END, review_text)
+                        review_parts.append(review_text)
                     except Exception as e:
                         # Handle sentiment analysis errors gracefully
                         review_text = f"""
@@ -651,36 +697,164 @@ Gross: {movie[11]}
 {review[3]}
 ----------------------------------------
 """
-                        self.reviews_text.insert(tk.END, review_text)
+                        review_parts.append(review_text)
             else:
-                self.reviews_text.insert(tk.END, "\nNo reviews yet.")
+                review_parts.append("\nNo reviews yet.")
+            ui_render.replace_text(self.reviews_text, ''.join(review_parts))
             
             # If user has already rated, show their rating
             if self.current_user:
                 user_rating = database.get_user_rating(self.current_user_id, movie_id)
                 if user_rating:
                     self.rating_var.set(user_rating)
-            
-            # Disable text widgets to prevent editing
-            self.details_text.config(state=tk.DISABLED)
-            self.reviews_text.config(state=tk.DISABLED)
+
+    def show_similar_movies(self, movie_id):
+        """Fill the More Like This list from the precomputed similarity index"""
+        self.similar_list.delete(0, tk.END)
+        self.similar_movie_ids = []
+        
+        index = similar_movies.get_index()
+        if index is None:
+            self.similar_list.insert(tk.END, "Similarity index not built yet")
+            return
+        
+        similar = index.similar(movie_id, k=5)
+        entries = []
+        for similar_id, title, year, rating in database.get_movies_by_ids([m for m, _ in similar]):
+            self.similar_movie_ids.append(similar_id)
+            entries.append(f"{title} ({year}) - IMDB {rating}")
+        if entries:
+            self.similar_list.insert(tk.END, *entries)
+
+    def on_similar_double_click(self, event):
+        """Select a movie from the More Like This list in the movie list"""
+        selection = self.similar_list.curselection()
+        if not selection or selection[0] >= len(self.similar_movie_ids):
+            return
+        
+        movie_id = self.similar_movie_ids[selection[0]]
+        self.tree_pages.flush()
+        for item in self.movie_tree.get_children():
+            if self.movie_tree.item(item)['values'][0] == movie_id:
+                self.movie_tree.selection_set(item)
+                self.movie_tree.see(item)
+                return
+        self.error_handler.show_info("More Like This", "This movie is hidden by the current search filter.")
 
     def on_search_change(self, *args):
         """Filter the movie list based on the search query"""
         query = self.search_var.get().strip().lower()
 
-        # Clear existing items in the Treeview
-        for item in self.movie_tree.get_children():
-            self.movie_tree.delete(item)
+        # Search the snapshot's title heap when available
+        snapshot = catalog_snapshot.get_snapshot()
+        if snapshot is not None:
+            matches = snapshot.search(query)
+            self.tree_pages.start(len(matches), lambda start, stop: snapshot.list_rows(matches, start, stop))
+            return
 
-        # Fetch all movies from the database
+        # Fetch all movies from the database and filter them
+        self.tree_pages.cancel()
         movies = database.get_all_movies()
+        ui_render.replace_tree_rows(self.movie_tree, [movie for movie in movies if query in movie[1].lower()])
 
-        # Filter and insert movies
-        for movie in movies:
-            movie_id, title, year, rating = movie
-            if query in title.lower():
-                self.movie_tree.insert('', tk.END, values=(movie_id, title, year, rating))
+    def show_recommendations(self):
+        """Show collaborative-filtering recommendations for the logged-in user"""
+        try:
+            if not self.current_user:
+                raise ValueError("Please login to see recommendations")
+
+            picks = recommender.recommend_for_user(self.current_user_id, n=20)
+            predicted = dict(picks)
+            movies = database.get_movies_by_ids([movie_id for movie_id, _ in picks])
+
+            window = tk.Toplevel(self.root)
+            window.title("Recommended for you")
+            window.geometry("600x400")
+
+            tree = ttk.Treeview(window, columns=('ID', 'Title', 'Year', 'Rating', 'Predicted'),
+                                show='headings', selectmode='browse')
+            tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+            tree.heading('ID', text='ID')
+            tree.heading('Title', text='Title')
+            tree.heading('Year', text='Year')
+            tree.heading('Rating', text='IMDB Rating')
+            tree.heading('Predicted', text='Predicted Score')
+            tree.column('ID', width=0, stretch=False)
+            tree.column('Title', width=280, anchor=tk.W)
+            tree.column('Year', width=60, anchor=tk.CENTER)
+            tree.column('Rating', width=90, anchor=tk.CENTER)
+            tree.column('Predicted', width=110, anchor=tk.CENTER)
+
+            rows = []
+            for movie_id, title, year, rating in movies:
+                score = predicted.get(movie_id)
+                score_str = f"{score:.1f}" if score is not None else "Popular"
+                rows.append((movie_id, title, year, rating, score_str))
+            ui_render.replace_tree_rows(tree, rows)
+            if not recommender.is_trained():
+                ttk.Label(window, text="Personal recommendations are being prepared; "
+                                       "showing popular movies for now.").pack(pady=(0, 10))
+            elif not movies:
+                ttk.Label(window, text="Rate a few movies to get recommendations.").pack(pady=(0, 10))
+        except Exception as e:
+            self.error_handler.handle_exception(e, "Recommendations")
+
+    def show_leaderboard(self):
+        """Show top movies by Bayesian-smoothed rating, filterable by genre and decade"""
+        try:
+            conn = database.create_connection()
+            if conn is None:
+                raise Exception("Failed to connect to the database.")
+            try:
+                leaderboard.update_leaderboard(conn)
+            finally:
+                conn.close()
+            genres, decades = leaderboard.get_leaderboard_filters()
+
+            window = tk.Toplevel(self.root)
+            window.title("Leaderboard")
+            window.geometry("650x500")
+
+            filter_frame = ttk.Frame(window)
+            filter_frame.pack(fill=tk.X, padx=10, pady=(10, 0))
+            ttk.Label(filter_frame, text="Genre:").pack(side=tk.LEFT)
+            genre_var = tk.StringVar(value="All")
+            ttk.Combobox(filter_frame, textvariable=genre_var, values=["All"] + genres,
+                         state="readonly", width=15).pack(side=tk.LEFT, padx=(5, 15))
+            ttk.Label(filter_frame, text="Decade:").pack(side=tk.LEFT)
+            decade_var = tk.StringVar(value="All")
+            ttk.Combobox(filter_frame, textvariable=decade_var, values=["All"] + [f"{d}s" for d in decades],
+                         state="readonly", width=8).pack(side=tk.LEFT, padx=5)
+
+            tree = ttk.Treeview(window, columns=('Rank', 'Title', 'Year', 'Score', 'Ratings'),
+                                show='headings', selectmode='browse')
+            tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+            tree.heading('Rank', text='#')
+            tree.heading('Title', text='Title')
+            tree.heading('Year', text='Year')
+            tree.heading('Score', text='Score')
+            tree.heading('Ratings', text='User Ratings')
+            tree.column('Rank', width=40, anchor=tk.CENTER)
+            tree.column('Title', width=300, anchor=tk.W)
+            tree.column('Year', width=60, anchor=tk.CENTER)
+            tree.column('Score', width=70, anchor=tk.CENTER)
+            tree.column('Ratings', width=100, anchor=tk.CENTER)
+
+            def refresh(*args):
+                genre = genre_var.get()
+                decade = decade_var.get()
+                rows = leaderboard.get_leaderboard(
+                    genre=None if genre == "All" else genre,
+                    decade=None if decade == "All" else int(decade[:-1]),
+                    limit=100)
+                ui_render.replace_tree_rows(tree, [(rank, title, year, f"{score:.2f}", app_count)
+                                                   for rank, (movie_id, title, year, score, app_count) in enumerate(rows, 1)])
+
+            genre_var.trace('w', refresh)
+            decade_var.trace('w', refresh)
+            refresh()
+        except Exception as e:
+            self.error_handler.handle_exception(e, "Leaderboard")
 
     def on_movie_double_click(self, event):
         """Handle double-click on a movie to show detailed information"""
@@ -728,4 +902,10 @@ if __name__ == '__main__':
     # Create and run the application
     root = tk.Tk()
     app = MovieApp(root)
+    if os.environ.get("MTIP_EXIT_AFTER_STARTUP"):
+        # Used by startup_check.py: close as soon as the first window has been drawn
+        root.after_idle(lambda: (root.update_idletasks(), root.destroy()))
+    else:
+        # The sentiment model is imported lazily; warm it up once the window is showing
+        root.after_idle(sentiment.preload_model)
     root.mainloop()
\ No newline at end of file
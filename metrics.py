@@ -0,0 +1,195 @@
+# metrics.py
+"""Lightweight latency metrics for the database and inference hot paths.
+
+Enable with MTIP_METRICS=1. When disabled, @instrument returns the function
+unchanged and timer() is a shared no-op context manager, so the cost is
+nothing beyond the decoration itself.
+
+Each metric records a call count, an error count, the total time and a
+latency histogram with fixed log-spaced buckets. Metrics can be read with
+snapshot()/format_report(), dumped periodically to a JSON file
+(MTIP_METRICS_DUMP=path, MTIP_METRICS_INTERVAL=seconds), or served by the
+API at /api/metrics.
+
+MTIP_SLOW_QUERY_MS=N additionally logs every SQL statement slower than N ms
+together with its EXPLAIN QUERY PLAN (see database.create_connection).
+"""
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+ENABLED = os.environ.get("MTIP_METRICS", "") not in ("", "0")
+SLOW_QUERY_MS = float(os.environ.get("MTIP_SLOW_QUERY_MS", "0"))
+SLOW_QUERY_LOG = os.environ.get("MTIP_SLOW_QUERY_LOG", "slow_queries.log")
+
+# Upper bounds in seconds: 100us, 250us, 500us, 1ms ... 10s, then overflow
+BUCKETS = tuple(m * 10 ** e for e in range(-4, 1) for m in (1, 2.5, 5)) + (10.0,)
+
+_lock = threading.Lock()
+_metrics = {}
+_slow_query_lock = threading.Lock()
+
+
+class Metric:
+    """Count, errors, total time and latency histogram for one operation"""
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def percentile(self, fraction):
+        """Upper bucket bound containing the given fraction of calls"""
+        target = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target and n:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return 0.0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'total_s': self.total,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(0.50) * 1000,
+            'p95_ms': self.percentile(0.95) * 1000,
+            'p99_ms': self.percentile(0.99) * 1000,
+            'max_ms': self.max * 1000,
+            'buckets': {('+Inf' if i == len(BUCKETS) else str(BUCKETS[i])): n for i, n in enumerate(self.buckets)},
+        }
+
+
+def _metric(name):
+    metric = _metrics.get(name)
+    if metric is None:
+        metric = _metrics.setdefault(name, Metric())
+    return metric
+
+
+def observe(name, seconds):
+    """Record one call of name taking seconds"""
+    with _lock:
+        _metric(name).observe(seconds)
+
+
+def record_error(name):
+    """Count an error for name (also used where errors are caught and printed)"""
+    if not ENABLED:
+        return
+    with _lock:
+        _metric(name).errors += 1
+
+
+def instrument(name):
+    """Decorator timing every call and counting raised exceptions"""
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                record_error(name)
+                raise
+            finally:
+                observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+_NULL_TIMER = nullcontext()
+
+
+@contextmanager
+def _timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        record_error(name)
+        raise
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def timer(name):
+    """Context manager timing a block, e.g. one phase of a longer function"""
+    return _timer(name) if ENABLED else _NULL_TIMER
+
+
+def snapshot():
+    """All metrics as a dict of plain values"""
+    with _lock:
+        return {name: metric.as_dict() for name, metric in sorted(_metrics.items())}
+
+
+def reset():
+    """Clear all recorded metrics"""
+    with _lock:
+        _metrics.clear()
+
+
+def format_report():
+    """Metrics as a fixed-width text table"""
+    lines = [f"{'operation':<40} {'count':>8} {'errors':>7} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9}"]
+    for name, m in snapshot().items():
+        lines.append(f"{name:<40} {m['count']:>8} {m['errors']:>7} "
+                     f"{m['mean_ms']:>9.2f} {m['p95_ms']:>9.2f} {m['max_ms']:>9.2f}")
+    return '\n'.join(lines)
+
+
+def log_slow_query(conn, sql, params, seconds):
+    """Append a slow statement and its query plan to the slow query log"""
+    try:
+        # Plain cursor, so the plan query is not itself timed and logged
+        plan = conn.cursor(sqlite3.Cursor).execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+        plan_text = '\n'.join(f"    {row[-1]}" for row in plan)
+    except Exception as e:
+        plan_text = f"    (no plan: {e})"
+    entry = (f"{time.strftime('%Y-%m-%d %H:%M:%S')} {seconds * 1000:.1f} ms\n"
+             f"  {' '.join(sql.split())}\n  params: {params!r}\n{plan_text}\n")
+    with _slow_query_lock:
+        with open(SLOW_QUERY_LOG, 'a', encoding='utf-8') as f:
+            f.write(entry)
+
+
+def start_periodic_dump(path, interval):
+    """Write snapshot() as JSON to path every interval seconds from a daemon thread"""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with open(f"{path}.tmp", 'w') as f:
+                    json.dump({'time': time.time(), 'metrics': snapshot()}, f, indent=1)
+                os.replace(f"{path}.tmp", path)
+            except OSError as e:
+                print(f"Error writing metrics dump: {e}")
+    thread = threading.Thread(target=run, name='metrics-dump', daemon=True)
+    thread.start()
+    return thread
+
+
+if ENABLED and os.environ.get("MTIP_METRICS_DUMP"):
+    start_periodic_dump(os.environ["MTIP_METRICS_DUMP"], float(os.environ.get("MTIP_METRICS_INTERVAL", "60")))
@@ -0,0 +1,175 @@
+# parallel_import.py
+"""Import a large IMDB-style movie CSV using every core.
+
+database.load_movies_from_csv parses the whole file in one process, which
+is fine for the bundled top-1000 list but leaves all but one core idle on
+multi-gigabyte catalogs. Here the file is cut into byte ranges of about
+--chunk-mb each. Every range starts right after a newline that is outside
+any quoted field, so quoted descriptions spanning several lines stay in one
+record. A process pool parses the ranges (csv module plus movie_fields),
+and the main process is the only writer: it bulk-inserts each parsed chunk
+with executemany inside a single transaction, while the workers parse the
+next ranges. At most two chunks per worker are in flight, so memory stays
+bounded however large the file is.
+
+Movies already in the catalog (same title, year and director) are skipped,
+as with the regular import. Afterwards the "More like this" index, the
+catalog snapshot and the leaderboard are rebuilt.
+
+Usage:
+    python parallel_import.py movies.csv [--workers N] [--chunk-mb N]
+"""
+import argparse
+import csv
+import io
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import database
+import movie_fields
+
+CHUNK_BYTES = 16 * 1024 * 1024
+SCAN_BLOCK = 1024 * 1024
+
+INSERT_MOVIE = '''
+    INSERT OR IGNORE INTO movies (
+        series_title, released_year, certificate, runtime,
+        genre, imdb_rating, overview, director, stars,
+        no_of_votes, gross
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def next_record_start(f, pos, quotes):
+    """First offset at or after pos that follows a newline outside quotes.
+
+    quotes is the number of '"' bytes before pos; returns (offset, quotes
+    before offset). Escaped quotes ("") come in pairs, so an even count
+    means the newline is not inside a quoted field.
+    """
+    f.seek(pos)
+    while True:
+        block = f.read(SCAN_BLOCK)
+        if not block:
+            return pos, quotes
+        start = 0
+        while True:
+            newline = block.find(b'\n', start)
+            if newline < 0:
+                quotes += block.count(b'"', start)
+                pos += len(block)
+                break
+            quotes += block.count(b'"', start, newline)
+            start = newline + 1
+            if quotes % 2 == 0:
+                return pos + start, quotes
+
+
+def split_ranges(path, chunk_bytes=CHUNK_BYTES):
+    """Header line and (start, end) byte ranges that each hold whole records"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        start, quotes = f.tell(), 0
+        ranges = []
+        while start < size:
+            target = min(start + chunk_bytes, size)
+            # Count the quotes skipped between the last boundary and the target
+            f.seek(start)
+            remaining = target - start
+            while remaining > 0:
+                block = f.read(min(SCAN_BLOCK, remaining))
+                quotes += block.count(b'"')
+                remaining -= len(block)
+            end, quotes = next_record_start(f, target, quotes) if target < size else (size, quotes)
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+
+def empty_to_none(value):
+    return value if value != '' else None
+
+
+def parse_range(path, header, start, end):
+    """Parse the records in one byte range into movies table rows (runs in a worker)"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    text = (header + data).decode('utf-8-sig')
+    rows = []
+    for row in csv.DictReader(io.StringIO(text, newline='')):
+        if None in row.values():
+            raise ValueError(f"Incomplete record in bytes {start}-{end}: {row.get('Title')!r}")
+        title, year, director, stars, votes, gross = movie_fields.parse_movie_fields(
+            row['Title'], row['Cast'], row['Info'])
+        rate = row['Rate']
+        rows.append((
+            title, year, empty_to_none(row['Certificate']), empty_to_none(row['Duration']),
+            empty_to_none(row['Genre']), float(rate) if rate else None, empty_to_none(row['Description']),
+            director, stars, votes, gross,
+        ))
+    return rows
+
+
+def import_movies(conn, csv_file, workers=None, chunk_bytes=CHUNK_BYTES):
+    """Parse csv_file in a process pool and insert it through conn; returns (records, inserted)"""
+    header, ranges = split_ranges(csv_file, chunk_bytes)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(ranges) or 1))
+    c = conn.cursor()
+    records = inserted = 0
+    with ProcessPoolExecutor(workers) as pool:
+        # Keep every worker busy with one chunk queued behind it; results are written in file order
+        queued = iter(ranges)
+        pending = deque(pool.submit(parse_range, csv_file, header, start, end)
+                        for start, end in islice(queued, 2 * workers))
+        while pending:
+            rows = pending.popleft().result()
+            for start, end in islice(queued, 1):
+                pending.append(pool.submit(parse_range, csv_file, header, start, end))
+            c.executemany(INSERT_MOVIE, rows)
+            inserted += c.rowcount
+            records += len(rows)
+    conn.commit()
+    return records, inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a movie CSV in parallel")
+    parser.add_argument('csv_file')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="parser processes")
+    parser.add_argument('--chunk-mb', type=float, default=CHUNK_BYTES / (1024 * 1024),
+                        help="approximate size of the byte range parsed per task")
+    args = parser.parse_args()
+
+    conn = database.create_connection()
+    if conn is None:
+        print("Error! Cannot create the database connection.")
+        return 1
+    try:
+        database.create_tables(conn)
+        start = time.monotonic()
+        records, inserted = import_movies(conn, args.csv_file, args.workers, int(args.chunk_mb * 1024 * 1024))
+        print(f"Parsed {records} movies, inserted {inserted} new ones in {time.monotonic() - start:.1f}s")
+        if inserted:
+            import similar_movies
+            similar_movies.build_index(conn)
+            import catalog_snapshot
+            catalog_snapshot.export_snapshot(conn)
+            # refresh_leaderboard only applies rating deltas, so new movies need a rebuild
+            import leaderboard
+            leaderboard.rebuild_leaderboard(conn)
+        return 0
+    except (database.Error, OSError, ValueError, KeyError) as e:
+        conn.rollback()
+        print(f"Error importing movies: {e}")
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
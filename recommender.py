@@ -0,0 +1,237 @@
+# recommender.py
+"""Collaborative-filtering "Recommended for you" engine over the ratings table.
+
+The model is a PureSVD factorization: ratings are mean-centred per user, a
+truncated SVD of the sparse user x movie matrix gives a movie factor matrix,
+and a user's predicted scores are their centred ratings projected onto that
+movie subspace. Movie factors are precomputed at training time, so a query
+costs one (n_movies x k) product. New ratings update the user's row in place
+and only move that user's projection; the factors are refit by retraining.
+
+Training reads every rating, so it runs on a background thread: until the
+first fit finishes, recommendations are the top of the leaderboard, and a
+stale model keeps serving its previous factors while it is refit. After a
+failed run the next one waits RETRY_DELAY seconds, doubling with each
+further failure up to RETRY_DELAY_MAX, so a broken database is not re-read
+every time the window opens.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+import database
+
+DEFAULT_FACTORS = 32
+FETCH_SIZE = 100000  # Ratings pulled from SQLite per fetchmany call
+RETRAIN_FRACTION = 0.05  # Retrain once this share of ratings changed since the last fit
+RETRY_DELAY = float(os.environ.get("MTIP_RECOMMENDER_RETRY", "30"))  # Seconds before retrying a failed training
+RETRY_DELAY_MAX = 3600
+
+
+def fetch_ratings(conn):
+    """Read the ratings table into (user_ids, movie_ids, scores) arrays"""
+    c = conn.cursor()
+    c.execute('SELECT user_id, movie_id, score FROM ratings')
+    chunks = []
+    while True:
+        rows = c.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        chunks.append(np.array(rows, dtype=np.int64))
+    if not chunks:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    data = np.concatenate(chunks)
+    return data[:, 0], data[:, 1], data[:, 2]
+
+
+class Recommender:
+    """Item-factor recommender trained from (user_id, movie_id, score) triples"""
+    def __init__(self, factors=DEFAULT_FACTORS):
+        self.factors = factors
+        self.lock = threading.Lock()
+        self.item_factors = None  # (n_movies, k) orthonormal movie vectors
+        self.movie_ids = np.empty(0, dtype=np.int64)
+        self.movie_index = {}
+        self.user_ratings = {}  # user_id -> {movie_index: score}
+        self.popular = np.empty(0, dtype=np.int64)  # Movie indices by rating count, cold-start fallback
+        self.trained_ratings = 0
+        self.pending_updates = 0
+        self.trained = False
+        self.replay = None  # Ratings added while a training read is in progress
+
+    def fit(self, user_ids, movie_ids, scores):
+        """Train the model from parallel arrays of ratings"""
+        # scipy is imported on first training rather than at app startup
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.linalg import svds
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        scores = np.asarray(scores, dtype=np.float64)
+
+        unique_users, user_rows = np.unique(user_ids, return_inverse=True)
+        unique_movies, movie_cols = np.unique(movie_ids, return_inverse=True)
+
+        # Centre each user's ratings on their own mean so taste, not scale, is factored
+        user_counts = np.bincount(user_rows, minlength=len(unique_users))
+        user_means = np.bincount(user_rows, weights=scores, minlength=len(unique_users)) / np.maximum(user_counts, 1)
+        centred = scores - user_means[user_rows]
+
+        matrix = coo_matrix((centred, (user_rows, movie_cols)),
+                            shape=(len(unique_users), len(unique_movies))).tocsr()
+
+        k = min(self.factors, min(matrix.shape) - 1)
+        item_factors = None
+        if k >= 1 and matrix.nnz > 0:
+            _, _, vt = svds(matrix, k=k)
+            item_factors = np.ascontiguousarray(vt.T)
+
+        # Keep raw ratings per user for fold-in and for excluding seen movies
+        user_ratings = {}
+        order = np.argsort(user_rows, kind='stable')
+        boundaries = np.cumsum(user_counts)[:-1]
+        for row, indices in zip(range(len(unique_users)), np.split(order, boundaries)):
+            user_ratings[int(unique_users[row])] = dict(zip(movie_cols[indices].tolist(), scores[indices].tolist()))
+
+        with self.lock:
+            self.item_factors = item_factors
+            self.movie_ids = unique_movies
+            self.movie_index = {int(movie_id): i for i, movie_id in enumerate(unique_movies)}
+            self.user_ratings = user_ratings
+            self.popular = np.argsort(-np.bincount(movie_cols, minlength=len(unique_movies)), kind='stable')
+            self.trained_ratings = len(scores)
+            self.pending_updates = 0
+            self.trained = True
+            # The training data may predate ratings added during the fit: apply them again
+            for update in self.replay or []:
+                self.apply_rating(*update)
+            self.replay = None
+
+    def train_from_database(self):
+        """Train the model from the ratings table (of every shard, read in parallel)"""
+        with self.lock:
+            self.replay = []
+        try:
+            parts = database.map_shards(lambda shard, conn: fetch_ratings(conn))
+            self.fit(*(np.concatenate(column) for column in zip(*parts)))
+            return True
+        except Exception as e:
+            with self.lock:
+                self.replay = None
+            print(f"Error training recommender: {e}")
+            return False
+
+    def update_rating(self, user_id, movie_id, score):
+        """Apply an added or changed rating without retraining the movie factors"""
+        with self.lock:
+            if self.replay is not None:
+                self.replay.append((user_id, movie_id, score))
+            self.apply_rating(user_id, movie_id, score)
+
+    def apply_rating(self, user_id, movie_id, score):
+        """Set a user's rating in the current model (caller holds the lock)"""
+        index = self.movie_index.get(movie_id)
+        if index is not None:
+            self.user_ratings.setdefault(user_id, {})[index] = float(score)
+        # Movies unseen at training time enter the model on the next retrain
+        self.pending_updates += 1
+
+    def needs_retrain(self):
+        """True once enough ratings changed that the factors are stale"""
+        return self.pending_updates > max(1, self.trained_ratings * RETRAIN_FRACTION)
+
+    def recommend(self, user_id, n=10):
+        """Return up to n (movie_id, predicted_score) pairs the user has not rated"""
+        with self.lock:
+            rated = self.user_ratings.get(user_id, {})
+            if not rated or self.item_factors is None:
+                # Cold start: most-rated movies the user has not seen
+                picks = [i for i in self.popular[:n + len(rated)] if i not in rated][:n]
+                return [(int(self.movie_ids[i]), None) for i in picks]
+
+            indices = np.fromiter(rated.keys(), dtype=np.int64, count=len(rated))
+            values = np.fromiter(rated.values(), dtype=np.float64, count=len(rated))
+            mean = values.mean()
+
+            # Fold the user in: project centred ratings onto the movie subspace
+            user_vector = (values - mean) @ self.item_factors[indices]
+            predicted = self.item_factors @ user_vector + mean
+            predicted[indices] = -np.inf
+
+            n = min(n, len(predicted) - len(indices))
+            if n <= 0:
+                return []
+            top = np.argpartition(-predicted, n - 1)[:n]
+            top = top[np.argsort(-predicted[top])]
+            return [(int(self.movie_ids[i]), float(predicted[i])) for i in top]
+
+
+_recommender = None
+_recommender_lock = threading.Lock()
+_training = None
+_failures = 0
+_failed_at = 0.0
+
+
+def train():
+    """Train the shared recommender, recording failures for the retry backoff"""
+    global _failures, _failed_at
+    ok = _recommender.train_from_database()
+    with _recommender_lock:
+        if ok:
+            _failures = 0
+        else:
+            _failures += 1
+            _failed_at = time.monotonic()
+
+
+def train_in_background():
+    """Start (re)training the shared recommender unless a run is in progress or a failed one is too recent"""
+    global _training
+    with _recommender_lock:
+        if _training is not None and _training.is_alive():
+            return
+        if _failures and time.monotonic() - _failed_at < min(RETRY_DELAY * 2 ** (_failures - 1), RETRY_DELAY_MAX):
+            return
+        _training = threading.Thread(target=train, name='recommender-train', daemon=True)
+        _training.start()
+
+
+def get_recommender():
+    """Return the shared recommender, starting background training on first use or when stale"""
+    global _recommender
+    with _recommender_lock:
+        if _recommender is None:
+            _recommender = Recommender()
+    if not _recommender.trained or _recommender.needs_retrain():
+        train_in_background()
+    return _recommender
+
+
+def is_trained():
+    """True once the shared recommender has finished a training run (before that, picks are popular movies)"""
+    return _recommender is not None and _recommender.trained
+
+
+def on_rating_added(user_id, movie_id, score):
+    """Feed a new rating to the shared recommender if it has been created"""
+    if _recommender is not None:
+        _recommender.update_rating(user_id, movie_id, score)
+
+
+def popular_picks(user_id, n):
+    """Top leaderboard movies the user has not rated, for use before the first training finishes"""
+    import leaderboard
+    rated = set(database.get_user_rated_movie_ids(user_id))
+    rows = leaderboard.get_leaderboard(limit=n + len(rated))
+    return [(movie_id, None) for movie_id, *_ in rows if movie_id not in rated][:n]
+
+
+def recommend_for_user(user_id, n=10):
+    """Top-n recommendations for a user as (movie_id, predicted_score) pairs (score None for popular picks)"""
+    model = get_recommender()
+    if not model.trained:
+        return popular_picks(user_id, n)
+    return model.recommend(user_id, n)
@@ -1,64 +1,391 @@
 # sentiment.py
-from transformers import pipeline, AutoModelForSequenceClassification, AutoTokenizer
-import torch
-
-# Initialize the sentiment analysis pipeline
-try:
-    # Load model and tokenizer
-    model_name = "tabularisai/multilingual-sentiment-analysis"
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForSequenceClassification.from_pretrained(model_name)
-    
-    # Determine device
-    if torch.backends.mps.is_available():
-        device = "mps"  # Use MPS for Apple Silicon
-    elif torch.cuda.is_available():
-        device = 0  # Use CUDA if available
+import gc
+import hashlib
+import multiprocessing
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+import metrics
+
+# Long review policy: "truncate" scores only the first MAX_LENGTH tokens,
+# "window" splits the review into overlapping windows and averages their scores
+LONG_TEXT_POLICY = os.environ.get("MTIP_SENTIMENT_POLICY", "window")
+MAX_LENGTH = 512  # Model input limit in tokens, including special tokens
+WINDOW_OVERLAP = 64  # Tokens shared by consecutive windows
+TOKEN_BUDGET = int(os.environ.get("MTIP_SENTIMENT_TOKEN_BUDGET", "2048"))  # Max tokens scored per review
+MAX_CHARS_PER_TOKEN = 8  # Texts are cut to TOKEN_BUDGET * this many chars before tokenizing
+
+CACHE_SIZE = int(os.environ.get("MTIP_SENTIMENT_CACHE_SIZE", "50000"))  # Max cached results, 0 disables
+SHORT_TEXT_LENGTH = 64  # Texts up to this length are also case-folded for the cache
+MIN_WORKER_CHUNK = 8  # Fewest texts worth sending to a pool worker
+
+MODEL_NAME = "tabularisai/multilingual-sentiment-analysis"
+
+# Set by load_model(); transformers and torch take seconds to import, so nothing
+# loads them until a review needs scoring (or preload_model() warms them up)
+tokenizer = None
+model = None
+device = -1
+sentiment_analyzer = None
+_model_loaded = False
+_model_lock = threading.Lock()
+
+def load_model():
+    """Load the sentiment pipeline on first use; returns it, or None if it failed to load."""
+    global tokenizer, model, device, sentiment_analyzer, MAX_LENGTH, _model_loaded
+    if _model_loaded:
+        return sentiment_analyzer
+    with _model_lock:
+        if _model_loaded:
+            return sentiment_analyzer
+        # Initialize the sentiment analysis pipeline
+        try:
+            import torch
+            from transformers import pipeline, AutoModelForSequenceClassification, AutoTokenizer
+            
+            # Load model and tokenizer
+            tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+            model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
+            # Tokenizers without a configured limit report a huge sentinel value
+            MAX_LENGTH = min(MAX_LENGTH, tokenizer.model_max_length)
+            
+            # Determine device
+            if torch.backends.mps.is_available():
+                device = "mps"  # Use MPS for Apple Silicon
+            elif torch.cuda.is_available():
+                device = 0  # Use CUDA if available
+            else:
+                device = -1  # Use CPU as fallback
+            
+            # Create pipeline
+            sentiment_analyzer = pipeline(
+                "sentiment-analysis",
+                model=model,
+                tokenizer=tokenizer,
+                device=device,
+                top_k=None  # Get all sentiment scores
+            )
+        except Exception as e:
+            print(f"Error initializing sentiment analyzer: {e}")
+            sentiment_analyzer = None
+        _model_loaded = True
+    return sentiment_analyzer
+
+def preload_model():
+    """Load the model in a background thread, so the first review shown does not wait for it"""
+    thread = threading.Thread(target=load_model, name='sentiment-preload', daemon=True)
+    thread.start()
+    return thread
+
+# Five-class labels mapped to an ordinal value, used for the mean sentiment score
+LABEL_VALUES = {
+    'Very Negative': 1,
+    'Negative': 2,
+    'Neutral': 3,
+    'Positive': 4,
+    'Very Positive': 5,
+}
+
+def classify_scores(results):
+    """Collapse the five-class pipeline output into a label and a mean class score (1-5)."""
+    # Extract scores for each sentiment
+    scores = {item['label']: item['score'] for item in results}
+    
+    # Calculate combined scores
+    positive_score = scores.get('Very Positive', 0) + scores.get('Positive', 0)
+    negative_score = scores.get('Very Negative', 0) + scores.get('Negative', 0)
+    neutral_score = scores.get('Neutral', 0)
+    
+    # Expected value over the five classes
+    total = sum(scores.get(label, 0) for label in LABEL_VALUES)
+    mean_score = None
+    if total > 0:
+        mean_score = sum(value * scores.get(label, 0) for label, value in LABEL_VALUES.items()) / total
+    
+    # Determine sentiment based on highest score
+    max_score = max(positive_score, negative_score, neutral_score)
+    
+    if max_score == positive_score and positive_score > 0.3:  # Threshold for positive
+        return "POSITIVE", mean_score
+    elif max_score == negative_score and negative_score > 0.3:  # Threshold for negative
+        return "NEGATIVE", mean_score
     else:
-        device = -1  # Use CPU as fallback
-    
-    # Create pipeline
-    sentiment_analyzer = pipeline(
-        "sentiment-analysis",
-        model=model,
-        tokenizer=tokenizer,
-        device=device,
-        top_k=None  # Get all sentiment scores
-    )
-except Exception as e:
-    print(f"Error initializing sentiment analyzer: {e}")
-    sentiment_analyzer = None
+        return "NEUTRAL", mean_score
 
-def predict_sentiment(text):
-    """Predict sentiment label: POSITIVE, NEUTRAL, or NEGATIVE based on detailed scores."""
+def split_windows(text):
+    """Split a review into (window_text, token_count) pieces that fit the model.
+
+    Short reviews come back unchanged. Longer ones are truncated or split into
+    overlapping windows according to LONG_TEXT_POLICY, and never more than
+    TOKEN_BUDGET tokens are kept, so the cost per review is bounded.
+    """
+    text = text[:TOKEN_BUDGET * MAX_CHARS_PER_TOKEN]
+    if tokenizer is None:
+        return [(text, 1)]
+    
+    ids = tokenizer(text, add_special_tokens=False)['input_ids']
+    window_size = MAX_LENGTH - tokenizer.num_special_tokens_to_add()
+    if len(ids) <= window_size:
+        return [(text, max(len(ids), 1))]
+    
+    if LONG_TEXT_POLICY == "truncate":
+        return [(tokenizer.decode(ids[:window_size]), window_size)]
+    
+    step = window_size - WINDOW_OVERLAP
+    starts = list(range(0, len(ids) - WINDOW_OVERLAP, step))
+    # Keep evenly spaced windows (always the first and last) within the token budget
+    max_windows = max(1, TOKEN_BUDGET // window_size)
+    if len(starts) > max_windows:
+        if max_windows == 1:
+            starts = starts[:1]
+        else:
+            last = len(starts) - 1
+            starts = [starts[round(i * last / (max_windows - 1))] for i in range(max_windows)]
+    
+    windows = []
+    for start in starts:
+        window_ids = ids[start:start + window_size]
+        windows.append((tokenizer.decode(window_ids), len(window_ids)))
+    return windows
+
+def aggregate_window_scores(window_results, weights):
+    """Average per-label scores across windows, weighted by window length"""
+    total_weight = sum(weights)
+    combined = {}
+    for results, weight in zip(window_results, weights):
+        for item in results:
+            combined[item['label']] = combined.get(item['label'], 0) + item['score'] * weight / total_weight
+    return [{'label': label, 'score': score} for label, score in combined.items()]
+
+def run_analyzer(texts, batch_size=None):
+    """Score texts with the length policy applied; returns aggregated pipeline output per text"""
+    windows = [split_windows(text) for text in texts]
+    flat = [window_text for text_windows in windows for window_text, _ in text_windows]
+    
+    kwargs = {'truncation': True, 'max_length': MAX_LENGTH}
+    if batch_size is not None:
+        kwargs['batch_size'] = batch_size
+    outputs = sentiment_analyzer(flat, **kwargs)
+    
+    results = []
+    position = 0
+    for text_windows in windows:
+        window_outputs = outputs[position:position + len(text_windows)]
+        position += len(text_windows)
+        if len(text_windows) == 1:
+            results.append(window_outputs[0])
+        else:
+            results.append(aggregate_window_scores(window_outputs, [n for _, n in text_windows]))
+    return results
+
+class InferenceCache:
+    """Size-bounded LRU of sentiment results keyed by a hash of the normalized text"""
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached result for key, or None"""
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def count_hit(self):
+        """Reclassify a miss as a hit (a duplicate served by a result still being computed)"""
+        with self.lock:
+            self.hits += 1
+            self.misses -= 1
+
+    def put(self, key, result):
+        """Store a result, evicting the least recently used entries over max_size"""
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return hits, misses, size and hit rate"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.entries),
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+inference_cache = InferenceCache(CACHE_SIZE)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def normalize_text(text):
+    """Normalize a review so trivially different copies share a cache entry (the key only, not model input)"""
+    text = _WHITESPACE_RE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+    if len(text) <= SHORT_TEXT_LENGTH:
+        text = text.casefold()
+    return text
+
+def cache_key(normalized):
+    """Content address of a normalized text"""
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+
+@metrics.instrument('sentiment.score_sentiment')
+def score_sentiment(text):
+    """Predict the sentiment label and mean five-class score (None if the model did not run)."""
     if not text or not isinstance(text, str):
-        return "NEUTRAL"
+        return "NEUTRAL", None
     
     try:
-        if sentiment_analyzer is None:
-            return "NEUTRAL"
+        if load_model() is None:
+            return "NEUTRAL", None
             
-        # Get all sentiment scores
-        results = sentiment_analyzer(text)[0]
+        key = cache_key(normalize_text(text))
+        cached = inference_cache.get(key)
+        if cached is not None:
+            return cached
         
-        # Extract scores for each sentiment
-        scores = {item['label']: item['score'] for item in results}
-        
-        # Calculate combined scores
-        positive_score = scores.get('Very Positive', 0) + scores.get('Positive', 0)
-        negative_score = scores.get('Very Negative', 0) + scores.get('Negative', 0)
-        neutral_score = scores.get('Neutral', 0)
-        
-        # Determine sentiment based on highest score
-        max_score = max(positive_score, negative_score, neutral_score)
-        
-        if max_score == positive_score and positive_score > 0.3:  # Threshold for positive
-            return "POSITIVE"
-        elif max_score == negative_score and negative_score > 0.3:  # Threshold for negative
-            return "NEGATIVE"
-        else:
-            return "NEUTRAL"
+        # Get all sentiment scores; the model is cased, so it sees the text as written
+        results = run_analyzer([text])[0]
+        result = classify_scores(results)
+        inference_cache.put(key, result)
+        return result
             
     except Exception as e:
+        metrics.record_error('sentiment.score_sentiment')
         print(f"Error in sentiment analysis: {e}")
-        return "NEUTRAL"
+        return "NEUTRAL", None
+
+@metrics.instrument('sentiment.predict_sentiment')
+def predict_sentiment(text):
+    """Predict sentiment label: POSITIVE, NEUTRAL, or NEGATIVE based on detailed scores."""
+    label, _ = score_sentiment(text)
+    return label
+
+def classify_texts(texts, batch_size=32):
+    """Run the model on texts, spread over the worker pool when one is running"""
+    if _worker_pool is None or len(texts) < 2 * MIN_WORKER_CHUNK:
+        return [classify_scores(output) for output in run_analyzer(texts, batch_size=batch_size)]
+    
+    chunk_size = max(MIN_WORKER_CHUNK, -(-len(texts) // _worker_count))
+    chunks = [(texts[i:i + chunk_size], batch_size) for i in range(0, len(texts), chunk_size)]
+    return [result for chunk in _worker_pool.starmap(_classify_in_worker, chunks) for result in chunk]
+
+@metrics.instrument('sentiment.predict_sentiments')
+def predict_sentiments(texts, batch_size=32):
+    """Score a list of texts in batched forward passes.
+
+    Returns a list of (label, mean_score) tuples in input order. Empty or
+    non-string texts are labelled NEUTRAL with a mean score of None.
+    Raises RuntimeError if the model failed to load, so bulk jobs do not
+    persist placeholder results.
+    """
+    if load_model() is None:
+        raise RuntimeError("Sentiment analyzer is not available")
+    
+    results = [("NEUTRAL", None)] * len(texts)
+    # Texts still to score, keyed by content address so duplicates in the batch run once
+    pending = {}
+    for i, text in enumerate(texts):
+        if not text or not isinstance(text, str):
+            continue
+        key = cache_key(normalize_text(text))
+        cached = inference_cache.get(key)
+        if cached is not None:
+            results[i] = cached
+        elif key in pending:
+            # Duplicate within the batch: served by the pending entry, not a new forward pass
+            inference_cache.count_hit()
+            pending[key][1].append(i)
+        else:
+            # The first copy is scored as written; the model is cased
+            pending[key] = (text, [i])
+    if not pending:
+        return results
+    
+    entries = list(pending.items())
+    scored = classify_texts([text for _, (text, _) in entries], batch_size)
+    for (key, (_, indices)), result in zip(entries, scored):
+        inference_cache.put(key, result)
+        for i in indices:
+            results[i] = result
+    return results
+
+# Worker pool: forked children share the parent's model weights copy-on-write
+_worker_pool = None
+_worker_count = 0
+
+def _init_pool_worker(cpu_sets, next_slot):
+    """Pin a forked worker to its own cores and size its torch thread pool to match"""
+    with next_slot.get_lock():
+        slot = next_slot.value
+        next_slot.value += 1
+    cpus = cpu_sets[slot % len(cpu_sets)]
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    import torch  # Already loaded in the parent before the fork
+    torch.set_num_threads(len(cpus))
+
+def _classify_in_worker(texts, batch_size):
+    """Score a chunk of texts inside a pool worker"""
+    return [classify_scores(output) for output in run_analyzer(texts, batch_size=batch_size)]
+
+def start_worker_pool(workers=None):
+    """Fork inference workers that share this process's loaded model.
+
+    Call before the parent starts other threads or runs inference, so the
+    children fork from a quiet process. Each worker is pinned to an equal
+    share of the available cores. Only supported for CPU inference on
+    platforms with fork; returns False (and batches keep running in-process)
+    otherwise.
+    """
+    global _worker_pool, _worker_count
+    if _worker_pool is not None:
+        return True
+    # The model loads before forking, so children share its weights
+    if load_model() is None or device != -1:
+        return False
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return False
+    
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    workers = max(1, min(workers or len(cpus), len(cpus)))
+    # Contiguous core ranges, so a worker's threads share caches
+    bounds = [len(cpus) * i // workers for i in range(workers + 1)]
+    cpu_sets = [set(cpus[bounds[i]:bounds[i + 1]]) for i in range(workers)]
+    
+    # Freezing the heap keeps the GC from writing to (and so copying) shared pages in children
+    gc.freeze()
+    ctx = multiprocessing.get_context('fork')
+    _worker_pool = ctx.Pool(workers, initializer=_init_pool_worker, initargs=(cpu_sets, ctx.Value('i', 0)))
+    _worker_count = workers
+    return True
+
+def stop_worker_pool():
+    """Shut down the worker pool; later calls run in-process again"""
+    global _worker_pool, _worker_count
+    if _worker_pool is not None:
+        _worker_pool.close()
+        _worker_pool.join()
+        _worker_pool = None
+        _worker_count = 0
+        gc.unfreeze()
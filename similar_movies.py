@@ -0,0 +1,220 @@
+# similar_movies.py
+"""Content-based "More like this" index over the movies table.
+
+Each movie is described by TF-IDF weighted overview words plus genre and
+cast (director and stars) tokens, each block weighted separately. The
+combined sparse matrix is reduced with a truncated SVD to dense unit
+vectors, and the top NEIGHBOURS for every movie are precomputed. Everything
+is saved as .npy files and opened memory-mapped, so loading is instant and a
+lookup is a single row read.
+
+Usage:
+    python similar_movies.py    # (re)build the index from movie_review.db
+"""
+import json
+import os
+import re
+import time
+from collections import Counter
+
+import numpy as np
+
+import catalog_snapshot
+import database
+
+INDEX_DIR = 'similar_index'
+DIMENSIONS = 128
+NEIGHBOURS = 20
+BLOCK_SIZE = 2048  # Movies scored per block while precomputing neighbours
+
+# Relative weight of each feature block in the similarity
+OVERVIEW_WEIGHT = 1.0
+GENRE_WEIGHT = 0.8
+CAST_WEIGHT = 0.6
+
+_WORD_RE = re.compile(r"[^\W\d_]{3,}")
+
+
+def overview_tokens(overview):
+    """Lower-cased words from an overview"""
+    return _WORD_RE.findall((overview or '').lower())
+
+
+def list_tokens(prefix, *fields):
+    """Tokens for comma-separated name lists such as genre or stars"""
+    tokens = []
+    for field in fields:
+        for name in (field or '').split(','):
+            name = name.strip().lower()
+            if name:
+                tokens.append(f"{prefix}:{name}")
+    return tokens
+
+
+def tfidf_block(documents, weight):
+    """Row-normalized TF-IDF matrix for tokenized documents, scaled by weight"""
+    from scipy.sparse import coo_matrix  # Only index builds need scipy
+    vocabulary = {}
+    rows, cols, counts = [], [], []
+    for row, tokens in enumerate(documents):
+        for token, count in Counter(tokens).items():
+            rows.append(row)
+            cols.append(vocabulary.setdefault(token, len(vocabulary)))
+            counts.append(count)
+
+    matrix = coo_matrix((np.asarray(counts, dtype=np.float32), (rows, cols)),
+                        shape=(len(documents), max(len(vocabulary), 1))).tocsr()
+    document_frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+    matrix = matrix.multiply(idf.astype(np.float32)).tocsr()
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    scale = (weight / norms).astype(np.float32)
+    return matrix.multiply(scale[:, None]).tocsr()
+
+
+def build_vectors(movies):
+    """Dense unit vectors for (movie_id, overview, genre, director, stars) rows"""
+    from scipy.sparse import hstack
+    from scipy.sparse.linalg import svds
+    features = hstack([
+        tfidf_block([overview_tokens(m[1]) for m in movies], OVERVIEW_WEIGHT),
+        tfidf_block([list_tokens('genre', m[2]) for m in movies], GENRE_WEIGHT),
+        tfidf_block([list_tokens('person', m[3], m[4]) for m in movies], CAST_WEIGHT),
+    ]).tocsr()
+
+    k = min(DIMENSIONS, min(features.shape) - 1)
+    if k >= 1:
+        u, s, _ = svds(features, k=k)
+        vectors = (u * s).astype(np.float32)
+    else:
+        vectors = features.toarray().astype(np.float32)
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def top_neighbours(vectors, k):
+    """Indices and cosine scores of the k nearest other movies for every movie"""
+    n = len(vectors)
+    k = min(k, n - 1)
+    neighbours = np.zeros((n, max(k, 0)), dtype=np.int32)
+    scores = np.zeros((n, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return neighbours, scores
+
+    for start in range(0, n, BLOCK_SIZE):
+        block = vectors[start:start + BLOCK_SIZE] @ vectors.T
+        block[np.arange(len(block)), np.arange(start, start + len(block))] = -np.inf
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        neighbours[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + len(block)] = np.take_along_axis(top_scores, order, axis=1)
+    return neighbours, scores
+
+
+def build_index(conn, index_dir=INDEX_DIR, k=NEIGHBOURS):
+    """Build the similarity index from the movies table and save it to index_dir"""
+    try:
+        c = conn.cursor()
+        c.execute('SELECT movie_id, overview, genre, director, stars FROM movies ORDER BY movie_id')
+        movies = c.fetchall()
+        if not movies:
+            print("No movies to index")
+            return False
+
+        vectors = build_vectors(movies)
+        neighbours, scores = top_neighbours(vectors, k)
+
+        # Build into a fresh directory and swap it in, so readers never see a mix of builds
+        staging_dir = catalog_snapshot.start_staging(index_dir)
+        arrays = {
+            'movie_ids': np.array([m[0] for m in movies], dtype=np.int64),
+            'vectors': vectors,
+            'neighbours': neighbours,
+            'neighbour_scores': scores,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(staging_dir, f"{name}.npy"), array)
+        with open(os.path.join(staging_dir, 'meta.json'), 'w') as f:
+            json.dump({'movies': len(movies), 'neighbours': int(neighbours.shape[1]), 'built_at': time.time()}, f)
+        catalog_snapshot.publish(staging_dir, index_dir)
+        print(f"Built similar movies index for {len(movies)} movies")
+        return True
+    except Exception as e:
+        print(f"Error building similar movies index: {e}")
+        return False
+
+
+class SimilarMoviesIndex:
+    """Memory-mapped similarity index produced by build_index"""
+    def __init__(self, index_dir=INDEX_DIR):
+        self.meta_path = os.path.join(index_dir, 'meta.json')
+        self.meta_mtime = os.stat(self.meta_path).st_mtime_ns
+        load = lambda name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode='r')
+        self.movie_ids = load('movie_ids')
+        self.vectors = load('vectors')
+        self.neighbours = load('neighbours')
+        self.neighbour_scores = load('neighbour_scores')
+
+    def is_replaced(self):
+        """True if a rebuild has replaced the files this index maps"""
+        try:
+            return os.stat(self.meta_path).st_mtime_ns != self.meta_mtime
+        except FileNotFoundError:
+            return True
+
+    def position(self, movie_id):
+        """Row of a movie in the index, or None if it is not indexed"""
+        i = int(np.searchsorted(self.movie_ids, movie_id))
+        if i < len(self.movie_ids) and self.movie_ids[i] == movie_id:
+            return i
+        return None
+
+    def similar(self, movie_id, k=10):
+        """Return up to k (movie_id, score) pairs most similar to movie_id"""
+        i = self.position(movie_id)
+        if i is None:
+            return []
+        if k <= self.neighbours.shape[1]:
+            rows = self.neighbours[i, :k]
+            return [(int(self.movie_ids[j]), float(s)) for j, s in zip(rows, self.neighbour_scores[i, :k])]
+
+        # More than precomputed: score against all vectors
+        scores = self.vectors @ self.vectors[i]
+        scores[i] = -np.inf
+        k = min(k, len(scores) - 1)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.movie_ids[j]), float(scores[j])) for j in top]
+
+
+_index = None
+
+
+def get_index():
+    """Return the shared index, or None if it has not been built"""
+    global _index
+    if _index is None or _index.is_replaced():
+        # Not loaded yet, or rebuilt since: map the files on disk again
+        _index = None
+        try:
+            _index = SimilarMoviesIndex()
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Similar movies index not available: {e}")
+            return None
+    return _index
+
+
+if __name__ == '__main__':
+    conn = database.create_connection()
+    if conn is not None:
+        build_index(conn)
+        conn.close()
+    else:
+        print("Error! Cannot create the database connection.")
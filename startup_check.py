@@ -0,0 +1,112 @@
+# startup_check.py
+"""Measure desktop app startup and fail when it goes over budget.
+
+Two measurements, each in a fresh interpreter so nothing is already imported:
+
+    imports  `python -X importtime -c "import main"`; prints the total and the
+             modules with the largest cumulative import time
+    window   `python main.py` with MTIP_EXIT_AFTER_STARTUP=1, which closes the
+             app as soon as its first window has been drawn; the wall time from
+             launch to exit is the time to an interactive window
+
+Heavy dependencies (pandas, scipy, transformers/torch) are imported on first
+use, so neither number should include them. The script exits with status 1
+when a measurement (best of --runs) exceeds its budget, so it can run in CI.
+The window measurement needs a display and is skipped without one.
+
+Usage:
+    python startup_check.py [--runs N] [--import-budget SECONDS] [--window-budget SECONDS] [--top N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+IMPORT_BUDGET = float(os.environ.get("MTIP_IMPORT_BUDGET", "0.5"))
+WINDOW_BUDGET = float(os.environ.get("MTIP_WINDOW_BUDGET", "1.0"))
+# Imported lazily on purpose; showing up at startup is a regression
+DEFERRED_MODULES = ('pandas', 'scipy', 'torch', 'transformers')
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_imports():
+    """Import main in a fresh interpreter; returns {module: cumulative seconds}"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=APP_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import main failed:\n{result.stderr[-2000:]}")
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, total, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(total) / 1e6
+    return cumulative
+
+
+def measure_window():
+    """Seconds from launching main.py until its first window is drawn and closed"""
+    env = dict(os.environ, MTIP_EXIT_AFTER_STARTUP='1')
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, 'main.py'], cwd=APP_DIR, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"main.py failed:\n{result.stderr[-2000:]}")
+    return elapsed
+
+
+def has_display():
+    return sys.platform in ('win32', 'darwin') or bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check desktop app startup time against a budget")
+    parser.add_argument('--runs', type=int, default=3, help="measurements per check; the best one counts")
+    parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET, help="seconds for import main")
+    parser.add_argument('--window-budget', type=float, default=WINDOW_BUDGET, help="seconds to the first window")
+    parser.add_argument('--top', type=int, default=10, help="slowest imports to list")
+    args = parser.parse_args()
+
+    failures = []
+    try:
+        runs = [measure_imports() for _ in range(args.runs)]
+    except RuntimeError as e:
+        print(f"Error measuring imports: {e}")
+        return 1
+    imports = min(runs, key=lambda run: run.get('main', 0.0))
+    import_time = imports.get('main', 0.0)
+    print(f"import main: {import_time * 1000:.0f} ms (budget {args.import_budget * 1000:.0f} ms)")
+    slowest = sorted(((t, name) for name, t in imports.items() if name != 'main'), reverse=True)[:args.top]
+    for seconds, name in slowest:
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+    if import_time > args.import_budget:
+        failures.append("import main is over budget")
+    eager = sorted(name for name in imports if name.split('.')[0] in DEFERRED_MODULES)
+    if eager:
+        failures.append(f"imported at startup instead of on first use: {', '.join(eager[:5])}")
+
+    if has_display():
+        try:
+            window_time = min(measure_window() for _ in range(args.runs))
+        except RuntimeError as e:
+            print(f"Error measuring startup: {e}")
+            return 1
+        print(f"first window: {window_time * 1000:.0f} ms (budget {args.window_budget * 1000:.0f} ms)")
+        if window_time > args.window_budget:
+            failures.append("time to first window is over budget")
+    else:
+        print("first window: skipped (no display)")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
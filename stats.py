@@ -0,0 +1,250 @@
+# stats.py
+"""Catalog and activity statistics for dashboards, served from memory.
+
+Totals of movies, users, ratings and reviews, plus rating distributions
+(globally and per genre), are kept in process memory. They start from one
+full count and are then kept current incrementally from what the writes
+leave behind: ratings through the rating_changes log that the ratings
+triggers append to, and new movies, users and reviews by primary key
+(ids only grow). A refresh reads only the rows written since the previous
+one, at most every REFRESH_INTERVAL seconds, so serving the stats costs
+the same however large the tables are. This also picks up writes made by
+other processes, such as the desktop app next to the API server.
+
+Every RECONCILE_INTERVAL seconds a background thread recounts everything
+and swaps in the fresh totals. That corrects changes the incremental path
+cannot see, e.g. deleted movies or reviews.
+
+Usage:
+    python stats.py [--genre GENRE]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import database
+import leaderboard
+
+REFRESH_INTERVAL = float(os.environ.get("MTIP_STATS_REFRESH", "2"))
+RECONCILE_INTERVAL = float(os.environ.get("MTIP_STATS_RECONCILE", "600"))
+SCORES = range(1, 11)
+
+
+class Totals:
+    """Counters for the whole catalog (genre None) and each genre, with the read positions they cover"""
+    def __init__(self):
+        self.movie_genres = {}  # movie_id -> genres
+        self.movies = {}  # genre -> movie count
+        self.reviews = {}  # genre -> review count
+        self.histograms = {}  # genre -> ratings per score, index 0 unused
+        self.users = 0
+        self.last_movie = 0
+        self.last_user = 0
+        self.last_change = {}  # shard -> last applied change_id
+        self.last_review = {}  # shard -> last counted review_id
+
+    def keys(self, movie_id):
+        return [None] + self.movie_genres.get(movie_id, [])
+
+    def add_movie(self, movie_id, genre):
+        genres = leaderboard.split_genres(genre)
+        self.movie_genres[movie_id] = genres
+        for key in [None] + genres:
+            self.movies[key] = self.movies.get(key, 0) + 1
+
+    def add_ratings(self, movie_id, score, count):
+        for key in self.keys(movie_id):
+            histogram = self.histograms.setdefault(key, [0] * 11)
+            histogram[score] += count
+
+    def add_reviews(self, movie_id, count):
+        for key in self.keys(movie_id):
+            self.reviews[key] = self.reviews.get(key, 0) + count
+
+    def summary(self, genre=None):
+        """Stats dict for the catalog or one genre"""
+        histogram = self.histograms.get(genre, [0] * 11)
+        ratings = sum(histogram)
+        summary = {
+            'movies': self.movies.get(genre, 0),
+            'ratings': ratings,
+            'reviews': self.reviews.get(genre, 0),
+            'rating_average': sum(s * histogram[s] for s in SCORES) / ratings if ratings else None,
+            'rating_distribution': {s: histogram[s] for s in SCORES},
+        }
+        if genre is None:
+            summary['users'] = self.users
+        return summary
+
+
+def read_core(conn, totals):
+    """Count movies and users added since totals' read positions"""
+    c = conn.cursor()
+    c.execute('SELECT movie_id, genre FROM movies WHERE movie_id > ? ORDER BY movie_id', (totals.last_movie,))
+    for movie_id, genre in c.fetchall():
+        totals.add_movie(movie_id, genre)
+        totals.last_movie = movie_id
+    c.execute('SELECT COUNT(*), MAX(user_id) FROM users WHERE user_id > ?', (totals.last_user,))
+    count, last_user = c.fetchone()
+    if count:
+        totals.users += count
+        totals.last_user = last_user
+
+
+def read_shard_totals(shard, conn):
+    """(last change_id, last review_id, ratings per (movie, score), reviews per movie) from one consistent read"""
+    c = conn.cursor()
+    c.execute('BEGIN')
+    try:
+        c.execute(database.LAST_CHANGE_ID)
+        last_change = c.fetchone()[0]
+        c.execute('SELECT COALESCE(MAX(review_id), 0) FROM reviews')
+        last_review = c.fetchone()[0]
+        c.execute('SELECT movie_id, score, COUNT(*) FROM ratings GROUP BY movie_id, score')
+        ratings = c.fetchall()
+        c.execute('SELECT movie_id, COUNT(*) FROM reviews GROUP BY movie_id')
+        return last_change, last_review, ratings, c.fetchall()
+    finally:
+        conn.rollback()
+
+
+def read_shard_deltas(shard, conn, last_change, last_review):
+    """Rating changes and new reviews after the given positions, as
+    (last change_id, last review_id, [(movie_id, old_score, new_score, count)], [(movie_id, count)])"""
+    c = conn.cursor()
+    c.execute('BEGIN')
+    try:
+        c.execute('''
+            SELECT movie_id, old_score, new_score, COUNT(*), MAX(change_id)
+            FROM rating_changes WHERE change_id > ?
+            GROUP BY movie_id, old_score, new_score
+        ''', (last_change,))
+        changes = c.fetchall()
+        c.execute('''
+            SELECT movie_id, COUNT(*), MAX(review_id)
+            FROM reviews WHERE review_id > ?
+            GROUP BY movie_id
+        ''', (last_review,))
+        reviews = c.fetchall()
+    finally:
+        conn.rollback()
+    last_change = max([last_change] + [row[4] for row in changes])
+    last_review = max([last_review] + [row[2] for row in reviews])
+    return (last_change, last_review,
+            [row[:4] for row in changes], [row[:2] for row in reviews])
+
+
+class StatsCache:
+    """In-memory Totals with incremental refreshes and periodic background reconciliation"""
+    def __init__(self, refresh_interval=REFRESH_INTERVAL, reconcile_interval=RECONCILE_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.reconcile_interval = reconcile_interval
+        self.lock = threading.Lock()
+        self.first_count_lock = threading.Lock()
+        self.totals = None
+        self.refreshed_at = 0.0
+        self.reconciled_at = 0.0
+        self.reconciler = None
+
+    def count_all(self):
+        """Fresh Totals from full counts (the reconciliation job)"""
+        totals = Totals()
+        conn = database.create_connection()
+        if conn is None:
+            raise database.Error("Cannot create the database connection")
+        try:
+            read_core(conn, totals)
+        finally:
+            conn.close()
+        for shard, (last_change, last_review, ratings, reviews) in zip(
+                database.shard_ids(), database.map_shards(read_shard_totals)):
+            totals.last_change[shard] = last_change
+            totals.last_review[shard] = last_review
+            for movie_id, score, count in ratings:
+                totals.add_ratings(movie_id, score, count)
+            for movie_id, count in reviews:
+                totals.add_reviews(movie_id, count)
+        return totals
+
+    def reconcile(self):
+        """Recount everything and replace the incrementally maintained totals"""
+        totals = self.count_all()
+        with self.lock:
+            self.totals = totals
+            self.refreshed_at = self.reconciled_at = time.monotonic()
+
+    def reconcile_in_background(self):
+        """Start a reconciliation thread unless one is running"""
+        if self.reconciler is not None and self.reconciler.is_alive():
+            return
+        def run():
+            try:
+                self.reconcile()
+            except database.Error as e:
+                print(f"Error reconciling stats: {e}")
+        self.reconciler = threading.Thread(target=run, name='stats-reconcile', daemon=True)
+        self.reconciler.start()
+
+    def refresh(self):
+        """Apply writes made since the last refresh (caller holds the lock)"""
+        totals = self.totals
+        conn = database.create_connection()
+        if conn is None:
+            raise database.Error("Cannot create the database connection")
+        try:
+            # Movies first, so ratings and reviews of new movies find their genres
+            read_core(conn, totals)
+        finally:
+            conn.close()
+        shard_deltas = database.map_shards(lambda shard, shard_conn: read_shard_deltas(
+            shard, shard_conn, totals.last_change[shard], totals.last_review[shard]))
+        for shard, (last_change, last_review, changes, reviews) in zip(database.shard_ids(), shard_deltas):
+            for movie_id, old_score, new_score, count in changes:
+                if old_score is not None:
+                    totals.add_ratings(movie_id, old_score, -count)
+                if new_score is not None:
+                    totals.add_ratings(movie_id, new_score, count)
+            for movie_id, count in reviews:
+                totals.add_reviews(movie_id, count)
+            totals.last_change[shard] = last_change
+            totals.last_review[shard] = last_review
+        self.refreshed_at = time.monotonic()
+
+    def get(self, genre=None):
+        """Stats for the catalog, or for one genre, at most refresh_interval seconds old"""
+        if self.totals is None:
+            # Concurrent cold requests wait for one full count instead of each running their own
+            with self.first_count_lock:
+                if self.totals is None:
+                    self.reconcile()
+        elif time.monotonic() - self.reconciled_at >= self.reconcile_interval:
+            self.reconcile_in_background()
+        with self.lock:
+            if time.monotonic() - self.refreshed_at >= self.refresh_interval:
+                self.refresh()
+            summary = self.totals.summary(genre)
+            if genre is None:
+                summary['genres'] = sorted(key for key in self.totals.movies if key is not None)
+            summary['age_seconds'] = round(time.monotonic() - self.refreshed_at, 3)
+            return summary
+
+
+stats_cache = StatsCache()
+
+
+def get_stats(genre=None):
+    """Catalog-wide stats, or one genre's, from memory; None if the database is unavailable"""
+    try:
+        return stats_cache.get(genre)
+    except database.Error as e:
+        print(f"Error getting stats: {e}")
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print dashboard statistics")
+    parser.add_argument('--genre', help="stats of one genre instead of the whole catalog")
+    args = parser.parse_args()
+    print(json.dumps(get_stats(args.genre), indent=2))
@@ -0,0 +1,147 @@
+# ui_profiler.py
+"""Profiling mode for MovieApp interactions.
+
+Enable with `python main.py --profile` or MTIP_PROFILE=1. Each profiled
+interaction (selecting a movie, typing in the search box, loading the list,
+submitting a rating or review) logs its wall time split into:
+
+    db         time inside database.py and auth.py calls
+    inference  time inside sentiment.py calls
+    widgets    everything else: Tk widget updates plus the handler's own code
+
+Set MTIP_PROFILE_CPROFILE=<dir> to also save a cProfile .prof file per
+interaction (open with `python -m pstats <file>` or snakeviz). A per-handler
+summary is printed when the application exits.
+"""
+import atexit
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+
+import auth
+import database
+import sentiment
+
+PROFILE_LOG = os.environ.get("MTIP_PROFILE_LOG")  # Default: stderr
+CPROFILE_DIR = os.environ.get("MTIP_PROFILE_CPROFILE")
+
+SEGMENT_MODULES = (
+    (database, 'db'),
+    (auth, 'db'),
+    (sentiment, 'inference'),
+)
+
+
+def is_enabled(argv=None):
+    """True if profiling was requested on the command line or in the environment"""
+    argv = sys.argv if argv is None else argv
+    return '--profile' in argv or os.environ.get("MTIP_PROFILE", "") not in ("", "0")
+
+
+class UIProfiler:
+    """Times interactions and attributes their wall time to db, inference and widgets"""
+    def __init__(self, log_path=PROFILE_LOG, cprofile_dir=CPROFILE_DIR):
+        self.log_path = log_path
+        self.cprofile_dir = cprofile_dir
+        self.local = threading.local()
+        self.totals = {}  # name -> [count, total, db, inference]
+        self.sequence = 0
+        if cprofile_dir:
+            os.makedirs(cprofile_dir, exist_ok=True)
+
+    def install(self):
+        """Wrap the public functions of the segment modules so their time is attributed"""
+        for module, segment in SEGMENT_MODULES:
+            for name, func in list(vars(module).items()):
+                if (callable(func) and not name.startswith('_') and not isinstance(func, type)
+                        and getattr(func, '__module__', None) == module.__name__):
+                    setattr(module, name, self.segment(segment, func))
+        atexit.register(self.print_summary)
+
+    def segment(self, segment, func):
+        """Wrap func so its time counts towards segment in the current interaction"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            segments = getattr(self.local, 'segments', None)
+            # Outside an interaction, or nested in another segment call: no double counting
+            if segments is None or self.local.active:
+                return func(*args, **kwargs)
+            self.local.active = True
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                segments[segment] += time.perf_counter() - start
+                self.local.active = False
+        return wrapper
+
+    def interaction(self, name, handler):
+        """Wrap a UI handler so each call is timed as one interaction"""
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            if getattr(self.local, 'segments', None) is not None:
+                # Nested interaction (e.g. refresh calling on_select_movie): part of the outer one
+                return handler(*args, **kwargs)
+            self.local.segments = {'db': 0.0, 'inference': 0.0}
+            self.local.active = False
+            profile = cProfile.Profile() if self.cprofile_dir else None
+            start = time.perf_counter()
+            try:
+                if profile is not None:
+                    return profile.runcall(handler, *args, **kwargs)
+                return handler(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - start, self.local.segments, profile)
+                self.local.segments = None
+        return wrapper
+
+    def record(self, name, total, segments, profile):
+        """Log one interaction and add it to the summary"""
+        self.sequence += 1
+        db, inference = segments['db'], segments['inference']
+        widgets = max(total - db - inference, 0.0)
+        stats = self.totals.setdefault(name, [0, 0.0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += total
+        stats[2] += db
+        stats[3] += inference
+
+        line = (f"[profile] {name}: {total * 1000:.1f} ms "
+                f"(db {db * 1000:.1f}, inference {inference * 1000:.1f}, widgets {widgets * 1000:.1f})")
+        if profile is not None:
+            path = os.path.join(self.cprofile_dir, f"{self.sequence:05d}_{name}.prof")
+            profile.dump_stats(path)
+            line += f" -> {path}"
+        self.write(line)
+
+    def write(self, line):
+        if self.log_path:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        else:
+            print(line, file=sys.stderr)
+
+    def print_summary(self):
+        """Per-handler totals and mean split"""
+        if not self.totals:
+            return
+        self.write(f"[profile] {'interaction':<20} {'calls':>6} {'mean ms':>9} {'db %':>6} {'infer %':>8} {'widgets %':>10}")
+        for name, (count, total, db, inference) in sorted(self.totals.items()):
+            share = lambda part: part / total * 100 if total else 0.0
+            self.write(f"[profile] {name:<20} {count:>6} {total / count * 1000:>9.1f} "
+                       f"{share(db):>6.1f} {share(inference):>8.1f} {share(total - db - inference):>10.1f}")
+
+
+PROFILED_HANDLERS = ('on_select_movie', 'on_search_change', 'load_movies', 'submit_review', 'submit_rating')
+
+
+def attach(app):
+    """Install the profiler and wrap app's handlers; call before the handlers are bound"""
+    profiler = UIProfiler()
+    profiler.install()
+    for name in PROFILED_HANDLERS:
+        setattr(app, name, profiler.interaction(name, getattr(app, name)))
+    return profiler
@@ -0,0 +1,104 @@
+# ui_render.py
+"""Batched Tk widget updates for MovieApp.
+
+Every tkinter widget method is a round trip into the Tcl interpreter, so
+filling a Treeview row by row or a Text widget review by review costs one
+round trip per row. These helpers replace a whole Treeview in two Tcl calls
+(one delete, one foreach loop running the inserts inside Tcl) and a Text
+widget's content in a single insert. IdleCoalescer collapses repeated
+refresh requests (e.g. one per keystroke in the search box) into a single
+run at the next idle point, and PagedTreeFill builds and inserts large row
+sets one page per idle point, so the first rows show right away.
+"""
+import tkinter as tk
+
+TREE_PAGE_SIZE = 2000
+
+
+def replace_tree_rows(tree, rows):
+    """Replace all rows of a Treeview with rows (tuples of column values)"""
+    children = tree.get_children()
+    if children:
+        tree.delete(*children)
+    append_tree_rows(tree, rows)
+
+
+def append_tree_rows(tree, rows):
+    """Add rows (tuples of column values) at the end of a Treeview"""
+    rows = tuple(tuple(row) for row in rows)
+    if rows:
+        # One Tcl call: the per-row inserts run inside the interpreter
+        tree.tk.call('foreach', '__mtip_row', rows, f'{tree._w} insert {{}} end -values $__mtip_row')
+
+
+def replace_text(widget, text, readonly=True):
+    """Replace the content of a Text widget with one insert"""
+    widget.config(state=tk.NORMAL)
+    widget.delete('1.0', tk.END)
+    widget.insert(tk.END, text)
+    if readonly:
+        widget.config(state=tk.DISABLED)
+
+
+class IdleCoalescer:
+    """Runs scheduled callbacks once at the next idle point, however often they were requested"""
+    def __init__(self, widget):
+        self.widget = widget
+        self.pending = {}
+        self.after_id = None
+
+    def schedule(self, key, callback, *args):
+        """Request callback(*args); a later request with the same key replaces the earlier one"""
+        self.pending[key] = (callback, args)
+        if self.after_id is None:
+            self.after_id = self.widget.after_idle(self.flush)
+
+    def flush(self):
+        """Run all pending callbacks now"""
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+        pending, self.pending = self.pending, {}
+        for callback, args in pending.values():
+            callback(*args)
+
+
+class PagedTreeFill:
+    """Replaces a Treeview's rows page by page, building each page only when it is inserted"""
+    def __init__(self, tree, page_size=TREE_PAGE_SIZE):
+        self.tree = tree
+        self.page_size = page_size
+        self.page = None
+        self.total = 0
+        self.filled = 0
+        self.after_id = None
+
+    def start(self, total, page):
+        """Show total rows, where page(start, stop) returns rows start..stop-1; the first page is shown now"""
+        self.cancel()
+        self.page, self.total, self.filled = page, total, 0
+        replace_tree_rows(self.tree, [])
+        self.fill_next()
+
+    def fill_next(self):
+        self.after_id = None
+        stop = min(self.filled + self.page_size, self.total)
+        append_tree_rows(self.tree, self.page(self.filled, stop))
+        self.filled = stop
+        if self.filled < self.total:
+            self.after_id = self.tree.after_idle(self.fill_next)
+        else:
+            self.page = None
+
+    def flush(self):
+        """Insert all remaining pages now"""
+        while self.after_id is not None:
+            self.tree.after_cancel(self.after_id)
+            self.fill_next()
+
+    def cancel(self):
+        """Drop the remaining pages (before the Treeview is replaced some other way)"""
+        if self.after_id is not None:
+            self.tree.after_cancel(self.after_id)
+            self.after_id = None
+        self.page = None
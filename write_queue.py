@@ -0,0 +1,215 @@
+# write_queue.py
+"""Write-behind group commit for ratings and reviews.
+
+database.add_rating and database.add_review open a connection and commit
+one row each, so every write pays for its own fsync. GroupCommitWriter
+instead queues writes for a single writer thread, which keeps collecting
+until it has max_rows writes or max_wait_ms has passed since the first one,
+applies them in one transaction and commits once. Each write runs inside
+its own savepoint, so a failing row is rolled back without failing the rest
+of the group.
+
+Callers get a Future of the usual (success, message) tuple. It resolves
+only after the group's COMMIT has returned, so a successful result is a
+durable acknowledgement. shutdown() stops accepting writes, commits
+everything already queued and closes the connection. With sharded storage
+there is one writer per shard, so shards commit independently.
+
+Enable it for the API server with MTIP_WRITE_BEHIND=1.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from sqlite3 import Error
+
+import database
+import metrics
+
+ENABLED = os.environ.get("MTIP_WRITE_BEHIND", "") not in ("", "0")
+MAX_ROWS = int(os.environ.get("MTIP_WRITE_BATCH_ROWS", "256"))
+MAX_WAIT_MS = float(os.environ.get("MTIP_WRITE_WAIT_MS", "5"))
+MAX_QUEUE_DEPTH = int(os.environ.get("MTIP_WRITE_QUEUE_DEPTH", "8192"))
+
+WRITERS = {
+    'rating': (database.insert_rating, "Error adding rating"),
+    'review': (database.insert_review, "Error adding review"),
+}
+
+
+class WriteQueueFullError(Exception):
+    """Raised when the write queue is at its maximum depth"""
+
+
+class GroupCommitWriter:
+    """Applies queued rating and review writes in grouped transactions"""
+    def __init__(self, shard=None, max_rows=MAX_ROWS, max_wait_ms=MAX_WAIT_MS, max_queue_depth=MAX_QUEUE_DEPTH):
+        self.shard = shard
+        self.max_rows = max_rows
+        self.max_wait = max_wait_ms / 1000
+        self.writes = queue.Queue(maxsize=max_queue_depth)
+        self.lock = threading.Lock()
+        self.stopping = False
+        self.groups = 0
+        self.rows = 0
+        self.conn = None  # Opened by the writer thread, which is its only user
+        self.worker = threading.Thread(target=self.run, name='group-commit', daemon=True)
+        self.worker.start()
+
+    def submit(self, kind, *args):
+        """Queue a write; returns a Future of (success, message) resolved after COMMIT"""
+        future = Future()
+        with self.lock:
+            if self.stopping:
+                raise RuntimeError("Write queue is shut down")
+            try:
+                self.writes.put_nowait((kind, args, future))
+            except queue.Full:
+                raise WriteQueueFullError("Write queue is full")
+        return future
+
+    def submit_rating(self, user_id, movie_id, score):
+        return self.submit('rating', user_id, movie_id, score)
+
+    def submit_review(self, user_id, movie_id, review_text):
+        return self.submit('review', user_id, movie_id, review_text)
+
+    def add_rating(self, user_id, movie_id, score, timeout=None):
+        """Blocking drop-in for database.add_rating"""
+        return self.submit_rating(user_id, movie_id, score).result(timeout)
+
+    def add_review(self, user_id, movie_id, review_text, timeout=None):
+        """Blocking drop-in for database.add_review"""
+        return self.submit_review(user_id, movie_id, review_text).result(timeout)
+
+    def collect_group(self):
+        """Block for the first write, then gather more until the group is full or the wait expires"""
+        first = self.writes.get()
+        if first is None:
+            return None
+        group = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(group) < self.max_rows:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.writes.get(timeout=remaining) if remaining > 0 else self.writes.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Shutdown sentinel: commit this group, then stop
+                self.writes.put_nowait(None)
+                break
+            group.append(item)
+        return group
+
+    def commit_group(self, group):
+        """Apply a group in one transaction; resolve futures only once it is committed"""
+        if self.conn is None:
+            for _, _, future in group:
+                future.set_result((False, "Database connection failed"))
+            return
+
+        results = []
+        with metrics.timer('write_queue.commit_group'):
+            try:
+                self.conn.execute('BEGIN IMMEDIATE')
+                for kind, args, _ in group:
+                    insert, error_prefix = WRITERS[kind]
+                    self.conn.execute('SAVEPOINT write')
+                    try:
+                        results.append(insert(self.conn, *args))
+                    except Error as e:
+                        self.conn.execute('ROLLBACK TO write')
+                        metrics.record_error(f'write_queue.{kind}')
+                        results.append((False, f"{error_prefix}: {str(e)}"))
+                    self.conn.execute('RELEASE write')
+                self.conn.execute('COMMIT')
+            except Error as e:
+                if self.conn.in_transaction:
+                    self.conn.execute('ROLLBACK')
+                metrics.record_error('write_queue.commit_group')
+                print(f"Error committing write group: {e}")
+                results = [(False, f"Error committing write: {str(e)}")] * len(group)
+
+        self.groups += 1
+        self.rows += len(group)
+        for (_, _, future), result in zip(group, results):
+            future.set_result(result)
+
+    def run(self):
+        """Writer loop: one transaction per collected group"""
+        self.conn = database.create_shard_connection(self.shard)
+        if self.conn is not None:
+            # Explicit BEGIN/COMMIT so savepoints nest inside the group transaction
+            self.conn.isolation_level = None
+        while True:
+            group = self.collect_group()
+            if group is None:
+                break
+            group = [write for write in group if write[2].set_running_or_notify_cancel()]
+            if not group:
+                continue
+            try:
+                self.commit_group(group)
+            except Exception as e:
+                # Never leave a caller waiting on a write the loop could not finish
+                for _, _, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+        if self.conn is not None:
+            self.conn.close()
+
+    def stats(self):
+        """Queue depth, group count and mean group size"""
+        return {
+            'queue_depth': self.writes.qsize(),
+            'groups': self.groups,
+            'rows': self.rows,
+            'mean_group_size': self.rows / self.groups if self.groups else 0.0,
+        }
+
+    def shutdown(self, timeout=None):
+        """Stop accepting writes, commit everything queued and close the connection"""
+        with self.lock:
+            if self.stopping:
+                return
+            self.stopping = True
+        # No submit can follow the sentinel, so every queued write is committed first
+        self.writes.put(None)
+        self.worker.join(timeout)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(shard=None):
+    """Return the shared writer for a shard (None: the main database), starting it on first use"""
+    with _writers_lock:
+        writer = _writers.get(shard)
+        if writer is None:
+            writer = _writers[shard] = GroupCommitWriter(shard)
+            atexit.register(writer.shutdown)
+        return writer
+
+
+def submit(kind, user_id, movie_id, value):
+    """Queue a rating or review with the writer for the movie's shard"""
+    return get_writer(database.shard_for_movie(movie_id)).submit(kind, user_id, movie_id, value)
+
+
+def stats():
+    """Stats of every started writer, keyed by shard"""
+    with _writers_lock:
+        writers = list(_writers.items())
+    return {('main' if shard is None else f'shard{shard}'): writer.stats() for shard, writer in writers}
+
+
+def shutdown():
+    """Commit queued writes and stop every writer"""
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.shutdown()